@@ -16,6 +16,13 @@ You should read the code, read the README ^ and edit accordingly.
 
 Many of these dithering processes are slow, you might want to pre-prepare an image!
 
+For quicker dithering without any extra dependencies, Inky has Bayer,
+blue-noise and error diffusion (Floyd-Steinberg, Atkinson, Stucki, Jarvis)
+dithering built in, eg:
+
+inky.set_image(image, saturation=0.5, dither="bayer8")
+inky.set_image(image, saturation=0.5, dither="stucki")
+
 You will need to install hitherdither from GitHub:
 
 sudo python3 -m pip install git+https://www.github.com/hbldh/hitherdither
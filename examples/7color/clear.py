@@ -8,9 +8,8 @@ from inky.inky_uc8159 import CLEAN
 inky = auto(ask_user=True, verbose=True)
 
 for _ in range(2):
-    for y in range(inky.height - 1):
-        for x in range(inky.width - 1):
-            inky.set_pixel(x, y, CLEAN)
+    inky.fill_rect(0, 0, inky.width, inky.height, CLEAN)
 
-    inky.show()
+    # The frame does not change, so force the second refresh
+    inky.show(force=True)
     time.sleep(1.0)
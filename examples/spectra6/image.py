@@ -4,9 +4,8 @@ import argparse
 import pathlib
 import sys
 
-from PIL import Image
-
 from inky.auto import auto
+from inky.loader import load_image
 
 parser = argparse.ArgumentParser()
 
@@ -24,8 +23,8 @@ if not args.file:
     {sys.argv[0]} --file image.png (--saturation 0.5)""")
     sys.exit(1)
 
-image = Image.open(args.file)
-resizedimage = image.resize(inky.resolution)
+# Decodes JPEGs at a reduced scale, much faster for large photos
+resizedimage = load_image(args.file, inky.resolution)
 
 try:
     inky.set_image(resizedimage, saturation=saturation)
@@ -0,0 +1,62 @@
+"""asyncio interface to the Inky drivers."""
+import asyncio
+
+
+class AsyncInky:
+    """Drive an Inky display from an asyncio event loop.
+
+    Wraps any Inky driver instance so that updates can be awaited without
+    blocking the event loop. Drawing methods and attributes (`set_image`,
+    `set_pixel`, `width`, etc) are passed through to the wrapped display.
+
+    Example::
+
+        display = AsyncInky(auto())
+        display.set_image(image)
+        await display.show()
+
+    """
+
+    def __init__(self, display):
+        """Initialise an asyncio wrapper.
+
+        :param display: Inky driver instance, eg: from `inky.auto.auto()`
+
+        """
+        self.display = display
+
+    def __getattr__(self, name):
+        return getattr(self.display, name)
+
+    async def show(self, force=False, **kwargs):
+        """Show buffer on display.
+
+        The buffer is packed immediately. SPI transfers run on the display's
+        worker thread, see `show_async()`, while BUSY waits are parked on this
+        event loop by watching the GPIO line request's edge event fd.
+
+        :param force: If True, refresh the display even if the frame has not changed.
+
+        Other keyword arguments are passed to the display, eg: `region` on SSD1608/SSD1683.
+
+        """
+        loop = asyncio.get_running_loop()
+
+        def edge_wait(gpio, timeout):
+            return asyncio.run_coroutine_threadsafe(_readable(gpio.fd, timeout), loop).result()
+
+        # Simulators ignore edge_wait and finish on their own terms
+        await asyncio.wrap_future(self.display.show_async(force=force, edge_wait=edge_wait, **kwargs))
+
+
+async def _readable(fd, timeout):
+    """Wait for a file descriptor to become readable, returning False on timeout."""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(True))
+    try:
+        return await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
@@ -0,0 +1,86 @@
+"""Parallel image conversion in horizontal bands, for large displays."""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy
+
+# Band edges are aligned to the largest dither threshold tile
+BAND_ALIGN = 64
+
+# Rows of context converted above each band so error diffusion has settled by the seam
+BAND_OVERLAP = 16
+
+_pool_lock = threading.Lock()
+_thread_pool = None
+_process_pool = None
+
+
+def thread_pool():
+    """Return a shared thread pool, for conversions that release the GIL (PIL and NumPy)."""
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="inky-band")
+    return _thread_pool
+
+
+def process_pool():
+    """Return a shared process pool, for conversions that hold the GIL (pure Python loops)."""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _process_pool
+
+
+def band_rows(height, count, overlap=0):
+    """Split rows into bands.
+
+    Returns a list of (start, top, end), where rows top to end belong to the
+    band, and rows start to top are context for the conversion.
+
+    :param height: number of rows
+    :param count: number of bands
+    :param overlap: rows of context above each band
+
+    """
+    size = -(-height // max(count, 1))
+    size = -(-size // BAND_ALIGN) * BAND_ALIGN
+    return [(max(0, top - overlap), top, min(top + size, height)) for top in range(0, height, size)]
+
+
+def convert_bands(convert, image, out, bands=None, overlap=0, executor=None, remap=None):
+    """Convert an image band by band, writing the results into `out`.
+
+    :param convert: function taking a band of `image` and returning a 2D array of colours
+    :param image: PIL image, or array of pixels indexed [y][x]
+    :param out: array to receive the converted image, indexed [y][x]
+    :param bands: number of bands, defaults to the number of CPU cores
+    :param overlap: rows of context converted above each band, and then discarded
+    :param executor: :class:`concurrent.futures.Executor` to convert bands on, defaults to `thread_pool()`
+    :param remap: optional array mapping converted colours to the values written to `out`
+
+    """
+    if bands is None:
+        bands = os.cpu_count() or 1
+
+    is_array = isinstance(image, numpy.ndarray)
+    height = image.shape[0] if is_array else image.size[1]
+    rows = band_rows(height, bands, overlap)
+
+    def band(start, end):
+        if is_array:
+            return image[start:end]
+        return image.crop((0, start, image.size[0], end))
+
+    if len(rows) == 1:
+        results = [convert(image)]
+    else:
+        if executor is None:
+            executor = thread_pool()
+        results = executor.map(convert, [band(start, end) for start, _, end in rows])
+
+    for (start, top, end), result in zip(rows, results):
+        result = numpy.asarray(result)[top - start:]
+        out[top:end] = result if remap is None else remap[result]
@@ -0,0 +1,573 @@
+"""Behaviour shared by all Inky display drivers."""
+import hashlib
+import io
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy
+
+from . import spi
+from .frame import read_frame
+
+_executor_lock = threading.Lock()
+
+_UNKNOWN = object()
+
+
+def _register_value(data):
+    """Return command data in a form that can be compared, or None for frame data."""
+    if data is None:
+        return ()
+    if isinstance(data, int):
+        return (data,)
+    if isinstance(data, numpy.ndarray):
+        return None
+    return tuple(data)
+
+
+class InkyBase:
+    """Display update handling common to every Inky driver.
+
+    Drivers provide `_pack()`, returning the buffer packed into the display's
+    native format, and `_update(*frame)`, which sends a packed frame to the
+    display and runs the refresh sequence.
+
+    """
+
+    # Number of calls to show() skipped because the frame had not changed
+    skipped_refreshes = 0
+
+    _frame_hash = None
+
+    # Bounding box (x0, y0, x1, y1) of drawing since the last show()
+    _dirty = None
+
+    # Colours accepted by set_pixel, either a tuple of valid values or,
+    # if None, any value with `_colour_mask` applied.
+    _valid_colours = None
+    _colour_mask = 0xFF
+
+    # Optional SharedFramebuffer backing `buf`, see `share_buffer()`
+    _shared = None
+
+    # Generation of the shared framebuffer last packed by show()
+    shown_generation = None
+
+    # SPI bus number, updates to displays on the same bus take turns
+    spi_port = 0
+
+    # True while this display's update holds its SPI bus lock
+    _bus_held = False
+
+    # True while a frame sent by load_frame() waits for trigger_refresh()
+    _loaded = False
+    _loaded_hash = None
+
+    # Session mode, see `begin_session()`
+    _session = False
+
+    # True while the controller is reset, initialised and not in deep sleep
+    _awake = False
+
+    # Data last written to each register, while in a session
+    _registers = None
+
+    # Time (seconds) to hold the reset line, the same for every controller
+    _reset_pulse = 0.01
+
+    # Settle delay (seconds) and BUSY timeout applied after sending a command,
+    # see `_command_done()`. Commands not listed here are sent back-to-back
+    # with no delay or BUSY poll.
+    _command_timing = {}
+
+    @property
+    def buf(self):
+        """Framebuffer, colours indexed [y][x]."""
+        return self._buf
+
+    @buf.setter
+    def buf(self, value):
+        if self._shared is None:
+            self._buf = value
+            return
+
+        # Replacing the buffer copies into shared memory instead
+        with self._shared.writing() as buf:
+            buf[:] = value
+
+    @contextmanager
+    def _writing(self):
+        """Hold the shared framebuffer's write lock, if there is one, while changing `buf` in place."""
+        if self._shared is None:
+            yield
+            return
+
+        with self._shared.writing():
+            yield
+
+    def share_buffer(self, shared):
+        """Back `buf` with a framebuffer shared between processes.
+
+        Drawing in any process attached to `shared` changes what `show()`
+        sends, which packs a consistent snapshot of the latest complete frame.
+        `set_pixel()` writes without taking the lock, so wrap it in
+        `shared.writing()`.
+
+        :param shared: :class:`inky.shared.SharedFramebuffer` the same shape as `buf`
+
+        """
+        if shared.shape != self._buf.shape:
+            raise ValueError("Shared buffer must be {}x{}!".format(self._buf.shape[1], self._buf.shape[0]))
+        self._buf = shared.buf
+        self._shared = shared
+
+    def show(self, busy_wait=True, force=False, **kwargs):
+        """Show buffer on display.
+
+        :param busy_wait: If True, wait for display update to finish before returning.
+            If False the update finishes in the background, see `show_async`.
+        :param force: If True, refresh the display even if the frame has not changed.
+
+        Any other keyword arguments are driver specific and passed to `_pack()`.
+
+        """
+        future = self.show_async(force=force, **kwargs)
+        if busy_wait:
+            future.result()
+
+    def show_async(self, force=False, edge_wait=None, **kwargs):
+        """Show buffer on display without waiting for the refresh to finish.
+
+        The buffer is packed immediately, so it is safe to start drawing the
+        next frame as soon as this returns. The transfer and refresh run on a
+        worker thread owned by this display, one update at a time.
+
+        If the buffer, border and flips match the last update the refresh
+        is skipped and `skipped_refreshes` is incremented.
+        Either way the dirty region is cleared.
+
+        :param force: If True, refresh the display even if the frame has not changed.
+        :param edge_wait: optional replacement for the blocking wait on BUSY edge events during
+            this update, see :meth:`inky.busy.BusyWait.edge_waiter`.
+
+        Returns a :class:`concurrent.futures.Future` which completes when the
+        display is idle again, or raises if the update failed.
+
+        """
+        frame = self._prepare(force, **kwargs)
+
+        if frame is None:
+            future = Future()
+            future.set_result(None)
+            return future
+
+        return self._show_executor().submit(self._update_frame, frame, edge_wait)
+
+    def load_frame(self, force=False, **kwargs):
+        """Send the buffer to the display's memory, without refreshing it.
+
+        The reset, init and transfer happen now, on the display's worker, so
+        a later `trigger_refresh()` changes the display with no other delay.
+        Eg: load the next minute of a clock early, then trigger it on the minute.
+
+        If the frame is already shown, nothing is loaded and the next
+        `trigger_refresh()` does nothing.
+
+        :param force: If True, load the frame even if it has not changed.
+
+        Any other keyword arguments are driver specific and passed to `_pack()`.
+
+        Returns a :class:`concurrent.futures.Future` which completes when the frame is loaded.
+
+        """
+        frame = self._prepare(force, **kwargs)
+
+        if frame is None:
+            future = Future()
+            future.set_result(None)
+            return future
+
+        # Not on the display until trigger_refresh()
+        digest, self._frame_hash = self._frame_hash, None
+        return self._show_executor().submit(self._load_frame, frame, digest)
+
+    def trigger_refresh(self, busy_wait=True):
+        """Refresh the display with the frame sent by `load_frame()`.
+
+        Only the commands that start the refresh are sent. If the frame is
+        still loading, the refresh starts as soon as it is done.
+
+        :param busy_wait: If True, wait for display update to finish before returning.
+
+        Returns a :class:`concurrent.futures.Future` which completes when the display is idle again.
+
+        """
+        future = self._show_executor().submit(self._refresh_frame)
+        if busy_wait:
+            future.result()
+        return future
+
+    def begin_session(self):
+        """Keep the display controller awake and initialised between updates.
+
+        Updates in a session skip the reset, and any init command whose
+        register already holds the right value. Drivers which put the
+        controller into deep sleep after every update leave it awake until
+        `end_session()`. An error always resets the controller next time.
+
+        """
+        self._session = True
+        if self._registers is None:
+            self._registers = {}
+
+    def end_session(self):
+        """End a session, putting the controller into deep sleep if the driver supports it."""
+        self._show_executor().submit(self._end_session).result()
+
+    @contextmanager
+    def session(self):
+        """Context manager for `begin_session()` and `end_session()`."""
+        self.begin_session()
+        try:
+            yield self
+        finally:
+            self.end_session()
+
+    def show_image(self, source, cache=None, busy_wait=True, **kwargs):
+        """Load and show an image, replaying its packed frame from a cache if possible.
+
+        On a cache hit nothing is decoded, converted or packed, and `buf` is
+        left as it was.
+
+        :param source: filename, bytes, file object or PIL image
+        :param cache: optional :class:`inky.cache.FrameCache`
+        :param busy_wait: If True, wait for display update to finish before returning.
+
+        Any other keyword arguments are passed to `set_image()`, eg: `saturation`, `dither` or `fit`.
+
+        """
+        key = None
+        if cache is not None:
+            key = cache.key(self, source, **kwargs)
+            frame = cache.get(key)
+            if frame is not None:
+                self._show_frame(frame, busy_wait)
+                return
+
+        from PIL import Image
+
+        image = source
+        if isinstance(source, (bytes, bytearray)):
+            image = Image.open(io.BytesIO(source))
+        elif not isinstance(source, Image.Image):
+            image = Image.open(source)
+
+        self.set_image(image, **kwargs)
+        frame = self._prepare(force=True)
+
+        if cache is not None:
+            cache.put(key, frame, driver=type(self).__module__, resolution=list(self.resolution))
+
+        future = self._show_executor().submit(self._update_frame, frame)
+        if busy_wait:
+            future.result()
+
+    def show_frame(self, path, busy_wait=True):
+        """Show a frame file, eg: from `python -m inky.compile`.
+
+        The packed planes are memory-mapped and sent as they are, without
+        any image processing. The frame must have been compiled for this
+        driver and resolution. `buf` is left as it was.
+
+        :param path: frame file, see `inky.frame`
+        :param busy_wait: If True, wait for display update to finish before returning.
+
+        """
+        planes, header = read_frame(path)
+
+        drivers = {cls.__module__ for cls in type(self).__mro__}
+        if header.get("driver") not in drivers or header.get("resolution") != list(self.resolution):
+            raise ValueError("Frame is for {} {}, not this display!".format(header.get("driver"), header.get("resolution")))
+
+        self._show_frame(planes, busy_wait)
+
+    def _show_frame(self, frame, busy_wait=True):
+        """Send already packed planes to the display."""
+        # The buffer no longer matches the display, so never skip the next update
+        self._frame_hash = None
+        self._dirty = None
+
+        future = self._show_executor().submit(self._update_frame, frame)
+        if busy_wait:
+            future.result()
+        return future
+
+    def _prepare(self, force=False, **kwargs):
+        """Pack a frame for display, returning None if it is already shown."""
+        if self._shared is not None:
+            # Pack a snapshot, so writers in other processes can't tear the frame
+            self.shown_generation, self._buf = self._shared.snapshot()
+            try:
+                return self._prepare_buffer(force, **kwargs)
+            finally:
+                self._buf = self._shared.buf
+
+        return self._prepare_buffer(force, **kwargs)
+
+    def _prepare_buffer(self, force, **kwargs):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((getattr(self, "border_colour", None), self.h_flip, self.v_flip, self.rotation)).encode())
+        digest.update(numpy.ascontiguousarray(self.buf))
+        digest = digest.digest()
+
+        if not force and digest == self._frame_hash:
+            self.skipped_refreshes += 1
+            self._dirty = None
+            return None
+
+        frame = self._pack(**kwargs)
+        self._dirty = None
+
+        # An explicit partial region may leave other changes off the display
+        self._frame_hash = digest if kwargs.get("region") in (None, "dirty") else None
+        return frame
+
+    def set_pixels(self, xs, ys, values):
+        """Set many pixels at once.
+
+        :param xs: x positions
+        :param ys: y positions
+        :param values: colour for every pixel, or a single colour for all of them
+
+        Pixels outside the display, and invalid colours, are skipped.
+
+        """
+        xs, ys = numpy.broadcast_arrays(numpy.asarray(xs, dtype=int), numpy.asarray(ys, dtype=int))
+        values, keep = self._colour_values(numpy.broadcast_to(values, xs.shape))
+        height, width = self.buf.shape
+        keep &= (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+
+        xs, ys = xs[keep], ys[keep]
+        if xs.size == 0:
+            return
+
+        with self._writing():
+            self.buf[ys, xs] = values[keep]
+        self._mark_buffer_dirty(xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+
+    def fill_rect(self, x, y, w, h, v):
+        """Fill a rectangle with a single colour.
+
+        :param x: left edge of the rectangle
+        :param y: top edge of the rectangle
+        :param w: width in pixels
+        :param h: height in pixels
+        :param v: colour to fill
+
+        The rectangle is clipped to the display.
+
+        """
+        value, keep = self._colour_values(numpy.asarray(v))
+        window = self._clip(x, y, w, h)
+        if not keep or window is None:
+            return
+
+        x0, y0, x1, y1 = window
+        with self._writing():
+            self.buf[y0:y1, x0:x1] = value
+        self._mark_buffer_dirty(x0, y0, x1, y1)
+
+    def blit(self, array, x=0, y=0):
+        """Copy a 2D array of colours onto the display.
+
+        :param array: colours, indexed [y][x]
+        :param x: position of the left edge of `array` on the display
+        :param y: position of the top edge of `array` on the display
+
+        The array is clipped to the display, and invalid colours are skipped.
+
+        """
+        array = numpy.asarray(array)
+        height, width = array.shape
+        window = self._clip(x, y, width, height)
+        if window is None:
+            return
+
+        x0, y0, x1, y1 = window
+        values, keep = self._colour_values(array[y0 - y:y1 - y, x0 - x:x1 - x])
+        with self._writing():
+            self.buf[y0:y1, x0:x1][keep] = values[keep]
+        self._mark_buffer_dirty(x0, y0, x1, y1)
+
+    def set_buffer(self, buf):
+        """Replace the whole display buffer.
+
+        :param buf: colours, indexed [y][x], the same shape as `buf`
+
+        Invalid colours leave the existing pixel unchanged.
+
+        """
+        buf = numpy.asarray(buf)
+        if buf.shape != self.buf.shape:
+            raise ValueError("Buffer must be {}x{} pixels!".format(self.buf.shape[1], self.buf.shape[0]))
+
+        values, keep = self._colour_values(buf)
+        self.buf = numpy.where(keep, values, self.buf).astype(numpy.uint8)
+        self._mark_buffer_dirty(0, 0, buf.shape[1], buf.shape[0])
+
+    def _colour_values(self, values):
+        """Return colours as set_pixel would write them, and a mask of those that are valid."""
+        if self._valid_colours is None:
+            return values & self._colour_mask, numpy.ones(values.shape, dtype=bool)
+        return values, numpy.isin(values, self._valid_colours)
+
+    def _clip(self, x, y, w, h):
+        """Clip a rectangle to the buffer, returning (x0, y0, x1, y1) or None if it is empty."""
+        height, width = self.buf.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, width), min(y + h, height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def _mark_buffer_dirty(self, x0, y0, x1, y1):
+        """Mark a buffer area, in set_pixel coordinates, as dirty."""
+        x, y = x0 - getattr(self, "offset_x", 0), y0 - getattr(self, "offset_y", 0)
+        self._mark_dirty(int(x), int(y), int(x1 - x0), int(y1 - y0))
+
+    def dirty_region(self):
+        """Return the (x, y, w, h) area drawn to since the last show(), or None.
+
+        Covers `set_pixel`, `set_image` and the bulk drawing methods, but not
+        direct writes to `buf`.
+
+        """
+        if self._dirty is None:
+            return None
+        x0, y0, x1, y1 = self._dirty
+        return x0, y0, x1 - x0, y1 - y0
+
+    def clear_dirty(self):
+        """Forget any drawing since the last show()."""
+        self._dirty = None
+
+    def _mark_dirty(self, x, y, w=1, h=1):
+        """Grow the dirty region to include an area of the display."""
+        if self._dirty is None:
+            self._dirty = (x, y, x + w, y + h)
+        else:
+            x0, y0, x1, y1 = self._dirty
+            self._dirty = (min(x0, x), min(y0, y), max(x1, x + w), max(y1, y + h))
+
+    def _update_frame(self, frame, edge_wait=None):
+        self._loaded = False
+        if edge_wait is None:
+            self._with_bus(self._update, *frame)
+            return
+
+        with self._busy.edge_waiter(edge_wait):
+            self._with_bus(self._update, *frame)
+
+    def _load_frame(self, frame, digest):
+        self._loaded = False
+        self._with_bus(self._load, *frame)
+        self._loaded = True
+        self._loaded_hash = digest
+
+    def _refresh_frame(self):
+        if not self._loaded:
+            return
+        self._loaded = False
+        self._with_bus(self._refresh)
+        self._frame_hash = self._loaded_hash
+
+    def _end_session(self):
+        self._session = False
+        self._registers = None
+        if self._awake:
+            self._with_bus(self._sleep)
+
+    def _sleep(self):
+        """Put the controller into deep sleep, for drivers which support it."""
+
+    def _needs_reset(self):
+        """Return False if a session can carry on without resetting the controller."""
+        return not (self._session and self._awake)
+
+    def _command_done(self, command):
+        """Apply a command's settle delay and BUSY wait from `_command_timing`."""
+        settle, busy_timeout = self._command_timing.get(command, (0, None))
+        if settle:
+            time.sleep(settle)
+        if busy_timeout is not None:
+            self._busy_wait(busy_timeout)
+
+    def _reset(self, timeout):
+        """Hardware reset the controller, returning once BUSY says it is ready.
+
+        :param timeout: maximum time to wait for BUSY in seconds, slept in full if BUSY is never asserted
+
+        """
+        with self._bus_released():
+            return self._busy.reset(self._gpio, self.reset_pin, self.busy_pin, self._reset_pulse, timeout)
+
+    def _settle(self, timeout):
+        """Wait for a command that may not assert BUSY, eg: a soft reset."""
+        with self._bus_released():
+            return self._busy.settle(self._gpio, self.busy_pin, timeout)
+
+    def _reset_registers(self):
+        """Forget register values after a reset."""
+        self._registers = {} if self._session else None
+
+    def _note_register(self, key, data):
+        """Remember the data a command wrote, in a session."""
+        if self._registers is not None:
+            self._registers[key] = _register_value(data)
+
+    def _register_cached(self, key, data):
+        """Return True if a session knows a register already holds `data`."""
+        if self._registers is None:
+            return False
+        value = _register_value(data)
+        return value is not None and self._registers.get(key, _UNKNOWN) == value
+
+    def _with_bus(self, method, *args):
+        """Run a driver method holding the SPI bus."""
+        try:
+            with spi.bus_lock(self.spi_port):
+                self._bus_held = True
+                try:
+                    method(*args)
+                finally:
+                    self._bus_held = False
+        except BaseException:
+            # The display is in an unknown state, so never skip the next update
+            self._frame_hash = None
+            self._awake = False
+            raise
+
+    @contextmanager
+    def _bus_released(self):
+        """Let other displays use the SPI bus, eg: while this one is busy refreshing."""
+        if not self._bus_held:
+            yield
+            return
+
+        lock = spi.bus_lock(self.spi_port)
+        self._bus_held = False
+        lock.release()
+        try:
+            yield
+        finally:
+            lock.acquire()
+            self._bus_held = True
+
+    def _show_executor(self):
+        with _executor_lock:
+            executor = getattr(self, "_executor", None)
+            if executor is None:
+                executor = self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inky")
+        return executor
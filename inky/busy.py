@@ -0,0 +1,181 @@
+"""BUSY line handling shared by the Inky drivers."""
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import timedelta
+
+import gpiod
+from gpiod.line import Direction, Edge, Value
+
+# Time (seconds) allowed for a controller to assert BUSY after a reset,
+# long enough to cover a 10ms debounce period.
+RESET_GRACE = 0.05
+
+
+class BusyWait:
+    """Wait for a display controller to release its BUSY line.
+
+    Waits block on kernel edge events rather than polling the line, so the
+    caller is woken as soon as the controller releases BUSY.
+
+    """
+
+    def __init__(self, busy_value=Value.INACTIVE, debounce=None, bias=None, raise_on_timeout=False, idle_grace=None):
+        """Initialise BUSY line handling.
+
+        :param busy_value: line value while the controller is busy, `Value.ACTIVE` or `Value.INACTIVE`
+        :param debounce: optional debounce period in milliseconds
+        :param bias: optional line bias, eg: `Bias.PULL_UP`
+        :param raise_on_timeout: raise a RuntimeError on timeout, rather than warn
+        :param idle_grace: time (seconds) allowed for the controller to assert BUSY if it is idle when a wait starts.
+            If BUSY is never asserted the line is assumed to be unconnected and the full timeout is slept.
+            `None` returns immediately from a wait on an idle line.
+
+        """
+        self.busy_high = busy_value == Value.ACTIVE
+        self.debounce = debounce
+        self.bias = bias
+        self.raise_on_timeout = raise_on_timeout
+        self.idle_grace = idle_grace
+        self.last_duration = 0.0
+
+        # Per-thread replacement for gpiod's blocking wait, see `edge_waiter()`
+        self._local = threading.local()
+
+        if self.busy_high:
+            self._assert_edge = gpiod.EdgeEvent.Type.RISING_EDGE
+        else:
+            self._assert_edge = gpiod.EdgeEvent.Type.FALLING_EDGE
+
+    def line_settings(self):
+        """Return gpiod line settings for the BUSY pin."""
+        kwargs = {"direction": Direction.INPUT, "edge_detection": Edge.BOTH}
+        if self.debounce is not None:
+            kwargs["debounce_period"] = timedelta(milliseconds=self.debounce)
+        if self.bias is not None:
+            kwargs["bias"] = self.bias
+        return gpiod.LineSettings(**kwargs)
+
+    @contextmanager
+    def edge_waiter(self, edge_wait):
+        """Replace gpiod's blocking wait for edge events, in this thread only.
+
+        :param edge_wait: function taking the line request and a timeout in seconds,
+            returning True once edge events are ready, or None for gpiod's own wait. See inky.aio.
+
+        """
+        previous = getattr(self._local, "edge_wait", None)
+        self._local.edge_wait = edge_wait
+        try:
+            yield
+        finally:
+            self._local.edge_wait = previous
+
+    def is_busy(self, gpio, pin):
+        """Return True if the controller is holding BUSY."""
+        return (gpio.get_value(pin) == Value.ACTIVE) == self.busy_high
+
+    def wait(self, gpio, pin, timeout):
+        """Wait for BUSY to be released.
+
+        :param gpio: gpiod line request containing the BUSY pin
+        :param pin: BUSY pin offset
+        :param timeout: maximum time to wait in seconds
+
+        Returns the time, in seconds, the controller spent busy.
+
+        """
+        t_start = time.monotonic()
+
+        if not self.is_busy(gpio, pin):
+            if self.idle_grace is None:
+                self._released(gpio, 0)
+                return self._done(t_start)
+
+            # BUSY may have already pulsed since the last wait (queued edges),
+            # otherwise give the controller a moment to assert it.
+            if not self._wait_edge_events(gpio, min(self.idle_grace, timeout)):
+                level = "low" if self.busy_high else "high"
+                warnings.warn(f"Busy Wait: Held {level}. Waiting for {timeout:0.2f}s")
+                time.sleep(max(0, timeout - (time.monotonic() - t_start)))
+                return self._done(t_start)
+
+            if self._released(gpio):
+                return self._done(t_start)
+
+        while True:
+            remaining = timeout - (time.monotonic() - t_start)
+            if remaining <= 0 or not self._wait_edge_events(gpio, remaining):
+                if self.raise_on_timeout:
+                    raise RuntimeError("Timeout waiting for busy signal to clear.")
+                warnings.warn(f"Busy Wait: Timed out after {timeout:0.2f}s")
+                break
+
+            if self._released(gpio):
+                break
+
+        return self._done(t_start)
+
+    def reset(self, gpio, reset_pin, pin, pulse, timeout):
+        """Pulse the reset line and wait for the controller to come out of reset.
+
+        :param gpio: gpiod line request containing the reset and BUSY pins
+        :param reset_pin: reset pin offset
+        :param pin: BUSY pin offset
+        :param pulse: time (seconds) to hold reset, the controller's minimum
+        :param timeout: maximum time to wait in seconds, slept in full if BUSY is never asserted
+
+        Returns the time, in seconds, from releasing reset until the controller was ready.
+
+        """
+        # Edges from before the pulse say nothing about the reset
+        self._released(gpio, 0)
+
+        gpio.set_value(reset_pin, Value.INACTIVE)
+        time.sleep(pulse)
+        gpio.set_value(reset_pin, Value.ACTIVE)
+
+        return self.settle(gpio, pin, timeout)
+
+    def settle(self, gpio, pin, timeout, grace=RESET_GRACE):
+        """Wait for an operation that may or may not be signalled on BUSY, eg: a reset.
+
+        :param gpio: gpiod line request containing the BUSY pin
+        :param pin: BUSY pin offset
+        :param timeout: maximum time to wait in seconds, slept in full if BUSY is never asserted
+        :param grace: time (seconds) allowed for the controller to assert BUSY
+
+        Returns the time, in seconds, until the controller was ready.
+
+        """
+        t_start = time.monotonic()
+
+        if not self.is_busy(gpio, pin) and not self._wait_edge_events(gpio, min(grace, timeout)):
+            # Nothing on BUSY, fall back to the fixed delay
+            time.sleep(max(0, timeout - (time.monotonic() - t_start)))
+            return self._done(t_start)
+
+        self.wait(gpio, pin, max(0, timeout - (time.monotonic() - t_start)))
+        return self._done(t_start)
+
+    def _wait_edge_events(self, gpio, timeout):
+        edge_wait = getattr(self._local, "edge_wait", None)
+        if edge_wait is not None:
+            return edge_wait(gpio, timeout)
+        return gpio.wait_edge_events(timedelta(seconds=timeout))
+
+    def _released(self, gpio, timeout=None):
+        """Drain queued edge events, returning True unless the last one asserted BUSY."""
+        if timeout is not None and not self._wait_edge_events(gpio, timeout):
+            return True
+
+        last = None
+        for event in gpio.read_edge_events():
+            last = event
+
+        return last is None or last.event_type != self._assert_edge
+
+    def _done(self, t_start):
+        self.last_duration = time.monotonic() - t_start
+        return self.last_duration
@@ -0,0 +1,149 @@
+"""On-disk cache of packed frames, for displays that cycle through the same images."""
+import glob
+import hashlib
+import os
+
+from . import frame
+from .palette import cache_dir
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_HASH_CHUNK = 1024 * 1024
+
+
+class FrameCache:
+    """Size-bounded, least recently used cache of packed frames.
+
+    Frames are keyed by a hash of the source image plus every display and
+    conversion setting that affects the packed output, and stored as frame
+    files (see `inky.frame`). A hit is memory-mapped straight from disk.
+
+    Example::
+
+        cache = FrameCache()
+        display.show_image("photo.jpg", cache=cache, fit="cover")
+
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        """Initialise a frame cache.
+
+        :param path: directory to store frames in, defaults to "frames" in `inky.palette.cache_dir()`
+        :param max_bytes: total size of cached frames to keep, oldest frames are removed first
+
+        """
+        self.path = path or os.path.join(cache_dir(), "frames")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, display, source, **kwargs):
+        """Return the cache key for showing `source` on `display`.
+
+        :param display: Inky driver instance
+        :param source: filename, bytes, file object or PIL image
+        :param kwargs: arguments for the display's `set_image()`
+
+        """
+        settings = (
+            "{}.{}".format(type(display).__module__, type(display).__qualname__),
+            tuple(display.resolution),
+            getattr(display, "colour", None),
+            getattr(display, "border_colour", None),
+            display.rotation,
+            display.h_flip,
+            display.v_flip,
+            sorted(kwargs.items())
+        )
+        digest = hashlib.blake2b(source_digest(source), digest_size=16)
+        digest.update(repr(settings).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached planes for a key, or None.
+
+        :param key: key from `key()`
+
+        """
+        path = self._path(key)
+        try:
+            planes, _ = frame.read_frame(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return planes
+
+    def put(self, key, planes, **metadata):
+        """Store packed planes, then trim the cache to `max_bytes`.
+
+        :param key: key from `key()`
+        :param planes: packed planes, eg: from a driver's `_pack()`
+        :param metadata: values to store in the frame header
+
+        """
+        frame.write_frame(self._path(key), planes, **metadata)
+        self._evict()
+
+    def clear(self):
+        """Remove every cached frame."""
+        for path in self._frames():
+            _remove(path)
+
+    def _path(self, key):
+        return os.path.join(self.path, key + ".frame")
+
+    def _frames(self):
+        return glob.glob(os.path.join(self.path, "*.frame"))
+
+    def _evict(self):
+        frames = []
+        for path in self._frames():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            frames.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in frames)
+        for _, size, path in sorted(frames):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+def source_digest(source):
+    """Return a digest of an image source's content.
+
+    :param source: filename, bytes, file object or PIL image
+
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                digest.update(chunk)
+    elif hasattr(source, "read"):
+        position = source.tell()
+        for chunk in iter(lambda: source.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+        source.seek(position)
+    else:
+        # A PIL image
+        digest.update(repr((source.mode, source.size, source.getpalette())).encode("utf-8"))
+        digest.update(source.tobytes())
+
+    return digest.digest()
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
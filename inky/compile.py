@@ -0,0 +1,149 @@
+"""Compile images into native frame files, ready for `display.show_frame()`.
+
+Converting photos for a colour display (decoding, resizing, quantizing,
+dithering and packing) is slow on a Raspberry Pi. This command does all of
+it ahead of time, on any machine, for every image in a directory:
+
+    python -m inky.compile photos/ frames/ --driver e673 --dither stucki --fit cover
+
+The Pi then only has to send each frame:
+
+    display.show_frame("frames/holiday.frame")
+
+See `inky.frame` for the file format.
+
+"""
+import argparse
+import importlib
+import inspect
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from . import frame
+
+DRIVERS = ("inky", "ssd1608", "ssd1683", "uc8159", "ac073tc1a", "e640", "e673", "el133uf1", "jd79661", "jd79668")
+
+EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp")
+
+_display = None
+
+
+class _NoEEPROM:
+    """Stand-in i2c bus, so drivers can be created away from the hardware."""
+
+    def write_i2c_block_data(self, *args):
+        raise OSError("No EEPROM")
+
+
+def create_display(driver, resolution=None, colour=None, h_flip=False, v_flip=False):
+    """Create a driver instance for converting images, without touching any hardware.
+
+    :param driver: one of `DRIVERS`
+    :param resolution: (width, height) in pixels, or None for the driver's default
+    :param colour: display colour, for the black/white/red and black/white/yellow drivers
+    :param h_flip: enable horizontal display flip
+    :param v_flip: enable vertical display flip
+
+    """
+    if driver not in DRIVERS:
+        raise ValueError("Unsupported driver: {}, must be one of {}".format(driver, ", ".join(DRIVERS)))
+
+    module = importlib.import_module("inky.inky" if driver == "inky" else "inky.inky_" + driver)
+    kwargs = {"h_flip": h_flip, "v_flip": v_flip, "i2c_bus": _NoEEPROM()}
+    if resolution is not None:
+        kwargs["resolution"] = tuple(resolution)
+    if colour is not None:
+        kwargs["colour"] = colour
+    return module.Inky(**kwargs)
+
+
+def compile_image(display, source, output, **kwargs):
+    """Convert an image and write it to a frame file.
+
+    :param display: driver instance, eg: from `create_display()`
+    :param source: image filename
+    :param output: frame filename
+    :param kwargs: arguments for the display's `set_image()`
+
+    """
+    from PIL import Image
+
+    with Image.open(source) as image:
+        display.set_image(image, **kwargs)
+
+    frame.write_frame(
+        output,
+        display._pack(),
+        driver=type(display).__module__,
+        resolution=list(display.resolution),
+        colour=getattr(display, "colour", None),
+        h_flip=display.h_flip,
+        v_flip=display.v_flip,
+        source=os.path.basename(source),
+        options={key: value for key, value in kwargs.items() if isinstance(value, (str, int, float, type(None)))}
+    )
+    return output
+
+
+def _init_worker(display_args):
+    global _display
+    _display = create_display(**display_args)
+
+
+def _compile(job):
+    source, output, kwargs = job
+    return compile_image(_display, source, output, **kwargs)
+
+
+def main(args=None):
+    """Compile a directory of images into frame files."""
+    parser = argparse.ArgumentParser(prog="python -m inky.compile", description="Compile images into native Inky frame files.")
+    parser.add_argument("source", help="Directory of images, or a single image")
+    parser.add_argument("output", help="Directory to write .frame files to")
+    parser.add_argument("--driver", "-d", required=True, choices=DRIVERS, help="Display driver")
+    parser.add_argument("--resolution", "-r", help="Display resolution, eg: 800x480")
+    parser.add_argument("--colour", "-c", help="Display colour, for the black/white/red and black/white/yellow displays")
+    parser.add_argument("--h-flip", action="store_true", help="Flip the display horizontally")
+    parser.add_argument("--v-flip", action="store_true", help="Flip the display vertically")
+    parser.add_argument("--saturation", "-s", type=float, help="Colour palette saturation")
+    parser.add_argument("--dither", help="Dither method, see inky.dither.METHODS")
+    parser.add_argument("--fit", default="cover", help="How to scale images which aren't the display size: contain, cover or stretch")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Number of images to convert at once")
+    args = parser.parse_args(args)
+
+    resolution = None
+    if args.resolution:
+        resolution = tuple(int(n) for n in args.resolution.lower().split("x"))
+
+    display_args = {"driver": args.driver, "resolution": resolution, "colour": args.colour, "h_flip": args.h_flip, "v_flip": args.v_flip}
+    display = create_display(**display_args)
+
+    # Only pass the options this driver's set_image() supports
+    supported = inspect.signature(display.set_image).parameters
+    kwargs = {"saturation": args.saturation, "dither": args.dither, "fit": args.fit, "bands": 1}
+    kwargs = {key: value for key, value in kwargs.items() if value is not None and key in supported}
+
+    if os.path.isdir(args.source):
+        sources = sorted(os.path.join(args.source, name) for name in os.listdir(args.source) if name.lower().endswith(EXTENSIONS))
+    else:
+        sources = [args.source]
+
+    os.makedirs(args.output, exist_ok=True)
+    jobs = [(source, os.path.join(args.output, os.path.splitext(os.path.basename(source))[0] + ".frame"), kwargs) for source in sources]
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker, initargs=(display_args,)) as executor:
+        futures = [(job[0], executor.submit(_compile, job)) for job in jobs]
+        for source, future in futures:
+            try:
+                print("{} -> {}".format(source, future.result()))
+            except Exception as e:  # noqa: BLE001 - report every image that failed and carry on
+                print("{}: {}".format(source, e), file=sys.stderr)
+                failed += 1
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""Display daemon, sharing one Inky between several programs.
+
+The daemon owns the driver, so GPIO and EEPROM setup happens once, and
+accepts frames from any number of clients over a Unix socket. Refreshes
+are slow, so frames are coalesced: while the display is refreshing only the
+newest frame waits, and any older waiting frame is dropped.
+
+Run the daemon::
+
+    python -m inky.daemon --socket /run/inky.sock
+
+And send it frames::
+
+    from inky.daemon import InkyClient
+
+    client = InkyClient("/run/inky.sock")
+    client.show_image("photo.png", saturation=0.5)
+
+Protocol: every request and reply is a line of JSON. Requests with a
+payload give its "size" in bytes, and the payload follows the line.
+
+Requests:
+
+* {"op": "image", "size": n, "options": {...}} - an encoded image (PNG, JPEG, ...),
+  options are any of `set_image()`'s "saturation", "dither", "fit" and "resample"
+* {"op": "buffer", "size": n} - raw `buf` contents, one byte per pixel
+* {"op": "frame", "path": "..."} - a frame file, see `inky.frame`
+* {"op": "status"}
+
+Replies to a frame all carry its "id", with "status" one of "queued",
+"refreshing" and finally "shown", "superseded" or "error" (with a "message").
+
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import sys
+import time
+import traceback
+
+import numpy
+
+_FINAL = ("shown", "superseded", "error")
+
+# set_image() arguments a client may pass with an image
+_IMAGE_OPTIONS = ("saturation", "dither", "fit", "resample")
+
+
+def default_socket_path():
+    """Return the default socket path, in $XDG_RUNTIME_DIR if it's set."""
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR") or "/tmp", "inky.sock")
+
+
+class InkyDaemon:
+    """Serve one display to many clients, showing only the newest frame."""
+
+    def __init__(self, display, path=None):
+        """Initialise a display daemon.
+
+        :param display: Inky driver instance, eg: from `inky.auto.auto()`
+        :param path: socket path, defaults to `default_socket_path()`
+
+        """
+        self.display = display
+        self.path = path or default_socket_path()
+        self.shown = 0
+        self.superseded = 0
+        self.busy = False
+        self._pending = None
+        self._next_id = 0
+        self._wake = None
+        self._server = None
+        self._worker = None
+
+    async def start(self):
+        """Start listening and refreshing the display."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._wake = asyncio.Event()
+        self._server = await asyncio.start_unix_server(self._client, path=self.path)
+        self._worker = asyncio.ensure_future(self._refresh_loop())
+
+    async def serve_forever(self):
+        """Run the daemon until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Stop listening and refreshing."""
+        self._worker.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def status(self):
+        """Return the daemon status, as sent to clients."""
+        return {
+            "status": "ok",
+            "driver": type(self.display).__module__,
+            "resolution": list(self.display.resolution),
+            "busy": self.busy,
+            "pending": self._pending is not None,
+            "shown": self.shown,
+            "superseded": self.superseded
+        }
+
+    def submit(self, op, payload, reply=None):
+        """Queue a frame, replacing any frame still waiting.
+
+        :param op: "image", "buffer" or "frame"
+        :param payload: image bytes, buffer bytes or frame path
+        :param reply: optional function taking a status dict
+
+        """
+        self._next_id += 1
+        item = (self._next_id, op, payload, reply or (lambda message: None))
+
+        if self._pending is not None:
+            self.superseded += 1
+            frame_id, _, _, previous = self._pending
+            previous({"id": frame_id, "status": "superseded"})
+
+        self._pending = item
+        item[3]({"id": item[0], "status": "queued"})
+        self._wake.set()
+        return item[0]
+
+    async def _refresh_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+
+            item, self._pending = self._pending, None
+            if item is None:
+                continue
+
+            frame_id, op, payload, reply = item
+            reply({"id": frame_id, "status": "refreshing"})
+            self.busy = True
+            started = time.monotonic()
+            try:
+                await loop.run_in_executor(None, self._show, op, payload)
+            except Exception as e:  # noqa: BLE001 - one bad frame must not stop the refresh loop
+                traceback.print_exc()
+                reply({"id": frame_id, "status": "error", "message": str(e)})
+            else:
+                self.shown += 1
+                reply({"id": frame_id, "status": "shown", "duration": round(time.monotonic() - started, 3)})
+            finally:
+                self.busy = False
+
+    def _show(self, op, payload):
+        display = self.display
+
+        if op == "frame":
+            display.show_frame(payload)
+        elif op == "image":
+            data, options = payload
+            display.show_image(data, **options)
+        else:
+            buf = numpy.frombuffer(payload, dtype=numpy.uint8)
+            if buf.size != display.buf.size:
+                raise ValueError("Buffer must be {} bytes!".format(display.buf.size))
+            display.set_buffer(buf.reshape(display.buf.shape))
+            display.show()
+
+    async def _client(self, reader, writer):
+        def reply(message):
+            if not writer.is_closing():
+                writer.write(json.dumps(message).encode("utf-8") + b"\n")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object")
+                    op = request.get("op")
+                    if op == "status":
+                        reply(self.status())
+                    elif op == "frame":
+                        self.submit(op, request["path"], reply)
+                    elif op in ("image", "buffer"):
+                        data = await reader.readexactly(int(request["size"]))
+                        if op == "image":
+                            options = request.get("options", {})
+                            if not isinstance(options, dict) or not set(options) <= set(_IMAGE_OPTIONS):
+                                raise ValueError("Image options must be some of: {}".format(", ".join(_IMAGE_OPTIONS)))
+                            data = (data, options)
+                        self.submit(op, data, reply)
+                    else:
+                        reply({"status": "error", "message": "Unknown op: {}".format(op)})
+                except (ValueError, KeyError) as e:
+                    reply({"status": "error", "message": str(e)})
+
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class InkyClient:
+    """Send frames to an Inky daemon."""
+
+    def __init__(self, path=None, timeout=None):
+        """Connect to an Inky daemon.
+
+        :param path: socket path, defaults to `default_socket_path()`
+        :param timeout: socket timeout in seconds, None to wait forever
+
+        """
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(path or default_socket_path())
+        self._file = self._socket.makefile("rb")
+        # Frame events read while waiting for another reply
+        self._events = []
+
+    def show_image(self, image, wait=True, **options):
+        """Show an image.
+
+        :param image: filename, encoded image bytes or PIL image
+        :param wait: If True, wait until the frame is shown or superseded and return its final status
+        :param options: arguments for the display's `set_image()`: `saturation`, `dither`, `fit` or `resample`
+
+        """
+        if isinstance(image, (str, os.PathLike)):
+            with open(image, "rb") as f:
+                image = f.read()
+        elif not isinstance(image, (bytes, bytearray)):
+            data = io.BytesIO()
+            image.save(data, "PNG")
+            image = data.getvalue()
+        return self._send({"op": "image", "size": len(image), "options": options}, image, wait)
+
+    def show_buffer(self, buf, wait=True):
+        """Show a raw buffer, the same shape as the display's `buf`.
+
+        :param buf: array of colours, indexed [y][x]
+        :param wait: If True, wait until the frame is shown or superseded and return its final status
+
+        """
+        data = numpy.ascontiguousarray(buf, dtype=numpy.uint8).tobytes()
+        return self._send({"op": "buffer", "size": len(data)}, data, wait)
+
+    def show_frame(self, path, wait=True):
+        """Show a frame file, as seen by the daemon.
+
+        :param path: frame file path
+        :param wait: If True, wait until the frame is shown or superseded and return its final status
+
+        """
+        return self._send({"op": "frame", "path": os.path.abspath(path)}, b"", wait)
+
+    def status(self):
+        """Return the daemon's status."""
+        self._socket.sendall(b'{"op": "status"}\n')
+        return self._reply(lambda message: "id" not in message)
+
+    def wait(self, frame_id):
+        """Wait for a frame sent with `wait=False` to be shown or superseded, returning its final status.
+
+        :param frame_id: "id" from the frame's "queued" reply
+
+        """
+        return self._reply(lambda message: message.get("id") == frame_id and message.get("status") in _FINAL)
+
+    def close(self):
+        """Disconnect from the daemon."""
+        self._file.close()
+        self._socket.close()
+
+    def _send(self, request, payload, wait):
+        self._socket.sendall(json.dumps(request).encode("utf-8") + b"\n" + payload)
+        # Events for earlier frames may arrive first, but only a new frame is "queued"
+        message = self._reply(lambda message: "id" not in message or message.get("status") == "queued")
+        if message.get("status") == "error" or not wait:
+            return message
+        return self.wait(message["id"])
+
+    def _reply(self, match):
+        """Return the first message matching `match`, keeping frame events that don't."""
+        for n, message in enumerate(self._events):
+            if match(message):
+                return self._events.pop(n)
+
+        while True:
+            message = self._read()
+            if match(message):
+                return message
+
+            if message.get("status") in _FINAL:
+                # Only the final event matters for a frame nobody is waiting on yet
+                self._events = [event for event in self._events if event.get("id") != message.get("id")]
+            self._events.append(message)
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Inky daemon closed the connection")
+        return json.loads(line)
+
+
+def main(args=None):
+    """Run the Inky display daemon."""
+    parser = argparse.ArgumentParser(prog="python -m inky.daemon", description="Share an Inky display between programs.")
+    parser.add_argument("--socket", default=default_socket_path(), help="Unix socket path")
+    parsed = parser.parse_args(args)
+
+    from .auto import auto
+
+    daemon = InkyDaemon(auto(ask_user=True, verbose=True), parsed.socket)
+    print("Listening on {}".format(daemon.path))
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
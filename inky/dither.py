@@ -0,0 +1,264 @@
+"""Dithering for the colour Inky drivers.
+
+Ordered dithering offsets every pixel with a tiled threshold map and picks
+the nearest palette colour from a lookup table, see `inky.palette.quantize()`.
+Everything is done with whole-array NumPy operations, so a full 800x480
+frame takes well under a second on a Raspberry Pi.
+
+Error diffusion works a row at a time. Only the error carried along a row
+is handled pixel by pixel, error pushed down to the following rows is
+added a whole row at a time.
+
+Methods:
+
+* "none" - nearest palette colour, with no dithering.
+* "bayer2", "bayer4", "bayer8", "bayer16" - Bayer matrix of the given size,
+  a regular cross-hatch pattern.
+* "bluenoise" - 64x64 blue-noise tile, an even but patternless grain.
+* "floyd-steinberg", "atkinson", "stucki", "jarvis" - error diffusion, slower
+  but with the finest detail.
+
+"""
+import functools
+
+import numpy
+
+from .palette import palette_lut, quantize
+
+# Error diffusion kernels as (divisor, [(dx, dy, weight), ...])
+KERNELS = {
+    "floyd-steinberg": (16, [
+        (1, 0, 7),
+        (-1, 1, 3), (0, 1, 5), (1, 1, 1)]),
+    "atkinson": (8, [
+        (1, 0, 1), (2, 0, 1),
+        (-1, 1, 1), (0, 1, 1), (1, 1, 1),
+        (0, 2, 1)]),
+    "stucki": (42, [
+        (1, 0, 8), (2, 0, 4),
+        (-2, 1, 2), (-1, 1, 4), (0, 1, 8), (1, 1, 4), (2, 1, 2),
+        (-2, 2, 1), (-1, 2, 2), (0, 2, 4), (1, 2, 2), (2, 2, 1)]),
+    "jarvis": (48, [
+        (1, 0, 7), (2, 0, 5),
+        (-2, 1, 3), (-1, 1, 5), (0, 1, 7), (1, 1, 5), (2, 1, 3),
+        (-2, 2, 1), (-1, 2, 3), (0, 2, 5), (1, 2, 3), (2, 2, 1)]),
+}
+
+METHODS = ("none", "bayer2", "bayer4", "bayer8", "bayer16", "bluenoise") + tuple(KERNELS)
+
+BLUE_NOISE_SIZE = 64
+
+
+@functools.lru_cache(maxsize=8)
+def bayer_matrix(size):
+    """Return a Bayer threshold matrix, with values from 0.0 to 1.0.
+
+    :param size: width and height of the matrix, a power of two
+
+    """
+    if size < 2 or size & (size - 1):
+        raise ValueError("Bayer matrix size must be a power of two!")
+
+    matrix = numpy.zeros((1, 1), dtype=int)
+    while matrix.shape[0] < size:
+        matrix = numpy.block([
+            [4 * matrix + 0, 4 * matrix + 2],
+            [4 * matrix + 3, 4 * matrix + 1]
+        ])
+
+    matrix = (matrix + 0.5) / (size * size)
+    matrix.flags.writeable = False
+    return matrix
+
+
+@functools.lru_cache(maxsize=4)
+def blue_noise(size=BLUE_NOISE_SIZE, sigma=1.5, seed=0):
+    """Return a tileable blue-noise threshold matrix, with values from 0.0 to 1.0.
+
+    Generated with Ulichney's void-and-cluster method, which takes a fraction
+    of a second, and cached for the life of the process.
+
+    :param size: width and height of the tile
+    :param sigma: radius of the energy filter, larger values give a coarser grain
+    :param seed: seed for the initial random pattern
+
+    """
+    # Gaussian energy filter centred on (0, 0), wrapping at the edges
+    d = numpy.minimum(numpy.arange(size), size - numpy.arange(size))
+    kernel = numpy.exp(-(d[:, None] ** 2 + d[None, :] ** 2) / (2 * sigma * sigma))
+
+    def splat(energy, index, sign):
+        y, x = divmod(int(index), size)
+        energy += sign * numpy.roll(kernel, (y, x), axis=(0, 1))
+
+    def tightest_cluster(pattern, energy):
+        return numpy.argmax(numpy.where(pattern, energy, -numpy.inf))
+
+    def largest_void(pattern, energy):
+        return numpy.argmin(numpy.where(pattern, numpy.inf, energy))
+
+    rng = numpy.random.default_rng(seed)
+    pattern = numpy.zeros((size, size), dtype=bool)
+    pattern.flat[rng.choice(size * size, size * size // 10, replace=False)] = True
+    energy = numpy.real(numpy.fft.ifft2(numpy.fft.fft2(pattern) * numpy.fft.fft2(kernel)))
+
+    # Spread the initial points out by moving clusters into voids until stable
+    while True:
+        cluster = tightest_cluster(pattern, energy)
+        pattern.flat[cluster] = False
+        splat(energy, cluster, -1)
+        void = largest_void(pattern, energy)
+        pattern.flat[void] = True
+        splat(energy, void, 1)
+        if void == cluster:
+            break
+
+    ranks = numpy.zeros(size * size, dtype=int)
+    initial = pattern.copy()
+    initial_energy = energy.copy()
+
+    # Rank the initial points, removing the tightest cluster each time
+    count = int(pattern.sum())
+    for rank in range(count - 1, -1, -1):
+        cluster = tightest_cluster(pattern, energy)
+        pattern.flat[cluster] = False
+        splat(energy, cluster, -1)
+        ranks[cluster] = rank
+
+    # Rank the remaining points, filling the largest void each time
+    pattern, energy = initial, initial_energy
+    for rank in range(count, size * size):
+        void = largest_void(pattern, energy)
+        pattern.flat[void] = True
+        splat(energy, void, 1)
+        ranks[void] = rank
+
+    matrix = (ranks.reshape((size, size)) + 0.5) / (size * size)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def threshold_map(method):
+    """Return the threshold matrix for a dither method.
+
+    :param method: "bluenoise" or one of the "bayer" methods
+
+    """
+    if method == "bluenoise":
+        return blue_noise()
+    if method in ("bayer2", "bayer4", "bayer8", "bayer16"):
+        return bayer_matrix(int(method[5:]))
+    raise ValueError("Unsupported dither method: {}, must be one of {}".format(method, ", ".join(METHODS)))
+
+
+def dither_image(image, palette, method="bayer8", spread=None, serpentine=True):
+    """Dither an image to a palette, returning an array of palette indexes.
+
+    :param image: PIL image, or array of [r, g, b] pixels indexed [y][x]
+    :param palette: flat list of r, g, b values, eg: from a driver's `_palette_blend()`
+    :param method: one of `METHODS`
+    :param spread: strength of ordered dithering, in RGB levels. Defaults to the spacing between palette colours.
+    :param serpentine: scan alternate rows right to left when diffusing error, to avoid directional artifacts
+
+    """
+    if not isinstance(image, numpy.ndarray):
+        image = image.convert("RGB")
+
+    if method == "none":
+        return quantize(image, palette)
+
+    if method in KERNELS:
+        return diffuse(image, palette, method, serpentine)
+
+    thresholds = threshold_map(method)
+    pixels = numpy.array(image, dtype=numpy.float32)[..., :3]
+
+    if spread is None:
+        spread = _palette_spacing(numpy.asarray(palette, dtype=numpy.float32).reshape((-1, 3)))
+
+    height, width = pixels.shape[:2]
+    size = thresholds.shape[0]
+    tiles = (-(-height // size), -(-width // size))
+    offsets = numpy.tile(thresholds.astype(numpy.float32) - 0.5, tiles)[:height, :width] * spread
+    pixels += offsets[..., None]
+
+    return quantize(pixels, palette)
+
+
+def diffuse(image, palette, kernel="floyd-steinberg", serpentine=True):
+    """Dither an image to a palette by error diffusion, returning an array of palette indexes.
+
+    :param image: array of [r, g, b] pixels indexed [y][x]
+    :param palette: flat list of r, g, b values, eg: from a driver's `_palette_blend()`
+    :param kernel: one of `KERNELS`
+    :param serpentine: scan alternate rows right to left, mirroring the kernel
+
+    """
+    try:
+        divisor, taps = KERNELS[kernel]
+    except KeyError:
+        raise ValueError("Unsupported error diffusion kernel: {}, must be one of {}".format(kernel, ", ".join(KERNELS)))
+
+    pixels = numpy.asarray(image)[..., :3]
+    height, width = pixels.shape[:2]
+
+    bits = 6
+    shift = 8 - bits
+    lut = palette_lut(palette, bits).tobytes()
+    colours = numpy.asarray(palette, dtype=numpy.float32).reshape((-1, 3)).tolist()
+
+    along = [(dx, weight / divisor) for dx, dy, weight in taps if dy == 0]
+    below = [(dx, dy, numpy.float32(weight / divisor)) for dx, dy, weight in taps if dy > 0]
+    depth = max(dy for _, dy, _ in taps)
+    pad = max(abs(dx) for dx, _, _ in taps)
+
+    # Image plus error, with room for error pushed off the edges
+    work = numpy.zeros((height + depth, width + pad * 2, 3), dtype=numpy.float32)
+    work[:height, pad:pad + width] = pixels
+
+    result = numpy.zeros((height, width), dtype=numpy.uint8)
+    error = numpy.zeros((width + pad * 2, 3), dtype=numpy.float32)
+
+    for y in range(height):
+        step = -1 if serpentine and y % 2 else 1
+        row = work[y].tolist()
+        errors = [[0.0, 0.0, 0.0]] * len(row)
+        indexes = bytearray(width)
+
+        for x in range(width) if step == 1 else range(width - 1, -1, -1):
+            r, g, b = row[x + pad]
+            ri = 0 if r < 0 else 255 if r > 255 else int(r)
+            gi = 0 if g < 0 else 255 if g > 255 else int(g)
+            bi = 0 if b < 0 else 255 if b > 255 else int(b)
+            index = lut[(ri >> shift) << (bits * 2) | (gi >> shift) << bits | bi >> shift]
+            cr, cg, cb = colours[index]
+            er, eg, eb = r - cr, g - cg, b - cb
+
+            for dx, weight in along:
+                pixel = row[x + pad + dx * step]
+                pixel[0] += er * weight
+                pixel[1] += eg * weight
+                pixel[2] += eb * weight
+
+            errors[x + pad] = [er, eg, eb]
+            indexes[x] = index
+
+        result[y] = numpy.frombuffer(indexes, dtype=numpy.uint8)
+
+        error[:] = errors
+        for dx, dy, weight in below:
+            dx *= step
+            work[y + dy, pad + dx:pad + dx + width] += error[pad:pad + width] * weight
+
+    return result
+
+
+def _palette_spacing(palette):
+    """Return the typical per-channel distance between neighbouring palette colours."""
+    distance = numpy.sqrt(numpy.square(palette[:, None, :] - palette[None, :, :]).sum(axis=2))
+    distance[distance == 0] = numpy.inf
+    nearest = distance.min(axis=1)
+    nearest = nearest[numpy.isfinite(nearest)]
+    if nearest.size == 0:
+        return 0.0
+    return float(numpy.median(nearest)) / numpy.sqrt(3)
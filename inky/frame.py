@@ -0,0 +1,108 @@
+"""Native frame files for Inky.
+
+A frame file holds the controller-ready planes returned by a driver's
+`_pack()`, so it can be sent to a display without any image processing.
+
+Layout, integers are little-endian:
+
+    magic        8 bytes   b"INKYFRM1"
+    header_size  uint32    size of the header in bytes
+    header       JSON, UTF-8
+    padding      up to a 64 byte boundary
+    planes       raw plane bytes, each starting on a 64 byte boundary
+
+The header is an object with a "planes" list of {"offset": int, "size": int},
+where offsets count from the start of the first plane, plus any metadata,
+eg: "driver" and "resolution".
+
+"""
+import json
+import os
+import struct
+import tempfile
+
+import numpy
+
+MAGIC = b"INKYFRM1"
+ALIGN = 64
+
+_PREFIX = struct.Struct("<8sI")
+
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def write_frame(path, planes, **metadata):
+    """Write packed planes to a frame file.
+
+    The file is written to a temporary name first, so readers never see a partial frame.
+
+    :param path: file to write
+    :param planes: sequence of packed planes, eg: the tuple returned by `_pack()`
+    :param metadata: JSON serialisable values to store in the header
+
+    """
+    planes = [numpy.ascontiguousarray(plane, dtype=numpy.uint8).ravel() for plane in planes]
+
+    layout = []
+    offset = 0
+    for plane in planes:
+        layout.append({"offset": offset, "size": plane.size})
+        offset = _align(offset + plane.size)
+
+    header = json.dumps(dict(metadata, planes=layout)).encode("utf-8")
+    prefix = _PREFIX.pack(MAGIC, len(header)) + header
+    prefix += bytes(_align(len(prefix)) - len(prefix))
+
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(prefix)
+            for plane, entry in zip(planes, layout):
+                f.seek(len(prefix) + entry["offset"])
+                f.write(plane.data)
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def read_header(path):
+    """Read the header of a frame file.
+
+    Returns the header dict and the file offset of the first plane.
+
+    :param path: file to read
+
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError("{} is truncated!".format(path))
+        magic, size = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError("{} is not an Inky frame file!".format(path))
+        header = json.loads(f.read(size).decode("utf-8"))
+    return header, _align(_PREFIX.size + size)
+
+
+def read_frame(path):
+    """Read a frame file, memory-mapping its planes.
+
+    Returns a tuple of planes, ready to pass to a driver's `_update()`,
+    and the header dict.
+
+    :param path: file to read
+
+    """
+    header, start = read_header(path)
+
+    # Copy-on-write, so a driver can keep and modify a plane without touching the file
+    planes = tuple(
+        numpy.memmap(path, dtype=numpy.uint8, mode="c", offset=start + entry["offset"], shape=(entry["size"],))
+        if entry["size"] else numpy.zeros(0, dtype=numpy.uint8)
+        for entry in header["planes"]
+    )
+    return planes, header
@@ -2,15 +2,16 @@
 import struct
 import time
 import warnings
-from datetime import timedelta
 
 import gpiod
 import gpiodevice
 import numpy
-from gpiod.line import Bias, Direction, Edge, Value
+from gpiod.line import Bias, Direction, Value
 from PIL import Image
 
-from . import eeprom
+from . import busy, eeprom, spi
+from .base import InkyBase
+from .loader import draft
 
 __version__ = "1.5.0"
 
@@ -28,6 +29,9 @@ MOSI_PIN = 10
 SCLK_PIN = 11
 CS0_PIN = 8
 
+# Longest wait (seconds) for BUSY after a reset, see InkyBase._reset()
+_RESET_TIMEOUT = 0.1
+
 _SPI_CHUNK_SIZE = 4096
 _SPI_COMMAND = 0
 _SPI_DATA = 1
@@ -41,7 +45,7 @@ _RESOLUTION = {
 }
 
 
-class Inky:
+class Inky(InkyBase):
     """Inky e-Ink Display Driver.
 
     Generally it is more convenient to use either the :class:`inky.InkyPHAT` or :class:`inky.InkyWHAT` classes.
@@ -52,8 +56,11 @@ class Inky:
     RED = 2
     YELLOW = 2
 
+    # Colours accepted by set_pixel and the bulk drawing methods
+    _valid_colours = (WHITE, BLACK, RED)
+
     def __init__(self, resolution=(400, 300), colour="black", cs_pin=CS0_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False,
-                 spi_bus=None, i2c_bus=None, gpio=None):
+                 spi_bus=None, i2c_bus=None, gpio=None, spi_port=0):
         """Initialise an Inky Display.
 
         :param resolution: Display resolution (width, height) in pixels, default: (400, 300).
@@ -70,6 +77,7 @@ class Inky:
         :param i2c_bus: SMB object. If `None` then :class:`smbus2.SMBus(1)` is used.
         :type i2c_bus: :class:`smbus2.SMBus`
         :param gpio: deprecated
+        :param int spi_port: SPI bus number, eg: `1` for SPI1, default: `0`.
         """
         self._spi_bus = spi_bus
         self._i2c_bus = i2c_bus
@@ -100,9 +108,11 @@ class Inky:
         self.dc_pin = dc_pin
         self.reset_pin = reset_pin
         self.busy_pin = busy_pin
+        self._busy = busy.BusyWait(busy_value=Value.ACTIVE, bias=Bias.DISABLED, raise_on_timeout=True)
         self.cs_pin = cs_pin
+        self.spi_port = spi_port
         try:
-            self.cs_channel = [8, 7].index(cs_pin)
+            self.cs_channel = spi.CS_PINS.get(spi_port, ()).index(cs_pin)
         except ValueError:
             self.cs_channel = 0
         self.h_flip = h_flip
@@ -240,14 +250,14 @@ class Inky:
                         self.cs_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
                         self.dc_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE, bias=Bias.DISABLED),
                         self.reset_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
-                        self.busy_pin: gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.FALLING, bias=Bias.DISABLED)
+                        self.busy_pin: self._busy.line_settings()
                     })
 
             if self._spi_bus is None:
                 import spidev
                 self._spi_bus = spidev.SpiDev()
 
-            self._spi_bus.open(0, self.cs_channel)
+            self._spi_bus.open(self.spi_port, self.cs_channel)
             try:
                 self._spi_bus.no_cs = True
             except OSError:
@@ -256,22 +266,19 @@ class Inky:
 
             self._gpio_setup = True
 
-        self._gpio.set_value(self.reset_pin, Value.INACTIVE)
-        time.sleep(0.1)
-        self._gpio.set_value(self.reset_pin, Value.ACTIVE)
-        time.sleep(0.1)
+        if self._needs_reset():
+            self._reset(_RESET_TIMEOUT)
+
+            self._send_command(0x12)  # Soft Reset
+            self._busy_wait(1.0)
+            self._reset_registers()
 
-        self._send_command(0x12)  # Soft Reset
-        self._busy_wait(1.0)
+        self._awake = True
 
     def _busy_wait(self, timeout=30.0):
-        """Wait for busy/wait pin."""
-        if self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            event = self._gpio.wait_edge_events(timedelta(seconds=timeout))
-            if not event:
-                raise RuntimeError("Timeout waiting for busy signal to clear.")
-            for event in self._gpio.read_edge_events():
-                pass
+        """Wait for busy/wait pin, returning the time in seconds the display was busy."""
+        with self._bus_released():
+            return self._busy.wait(self._gpio, self.busy_pin, timeout)
 
     def _update(self, buf_a, buf_b, busy_wait=True):
         """Update display.
@@ -280,6 +287,11 @@ class Inky:
         :param buf_b: Yellow/Red pixels
 
         """
+        self._load(buf_a, buf_b)
+        self._refresh(busy_wait)
+
+    def _load(self, buf_a, buf_b):
+        """Reset the display and write a frame to its RAM."""
         self.setup()
 
         packed_height = list(struct.pack("<H", self.rows))
@@ -287,39 +299,39 @@ class Inky:
         if isinstance(packed_height[0], str):
             packed_height = map(ord, packed_height)
 
-        self._send_command(0x74, 0x54)  # Set Analog Block Control
-        self._send_command(0x7E, 0x3B)  # Set Digital Block Control
+        self._send_init(0x74, 0x54)  # Set Analog Block Control
+        self._send_init(0x7E, 0x3B)  # Set Digital Block Control
 
-        self._send_command(0x01, packed_height + [0x00])  # Gate setting
+        self._send_init(0x01, packed_height + [0x00])  # Gate setting
 
-        self._send_command(0x03, 0x17)  # Gate Driving Voltage
-        self._send_command(0x04, [0x41, 0xAC, 0x32])  # Source Driving Voltage
+        self._send_init(0x03, 0x17)  # Gate Driving Voltage
+        self._send_init(0x04, [0x41, 0xAC, 0x32])  # Source Driving Voltage
 
-        self._send_command(0x3A, 0x07)  # Dummy line period
-        self._send_command(0x3B, 0x04)  # Gate line width
-        self._send_command(0x11, 0x03)  # Data entry mode setting 0x03 = X/Y increment
+        self._send_init(0x3A, 0x07)  # Dummy line period
+        self._send_init(0x3B, 0x04)  # Gate line width
+        self._send_init(0x11, 0x03)  # Data entry mode setting 0x03 = X/Y increment
 
-        self._send_command(0x2C, 0x3C)  # VCOM Register, 0x3c = -1.5v?
+        self._send_init(0x2C, 0x3C)  # VCOM Register, 0x3c = -1.5v?
 
-        self._send_command(0x3C, 0b00000000)
+        self._send_init(0x3C, 0b00000000)
         if self.border_colour == self.BLACK:
-            self._send_command(0x3C, 0b00000000)  # GS Transition Define A + VSS + LUT0
+            self._send_init(0x3C, 0b00000000)  # GS Transition Define A + VSS + LUT0
         elif self.border_colour == self.RED and self.colour == "red":
-            self._send_command(0x3C, 0b01110011)  # Fix Level Define A + VSH2 + LUT3
+            self._send_init(0x3C, 0b01110011)  # Fix Level Define A + VSH2 + LUT3
         elif self.border_colour == self.YELLOW and self.colour == "yellow":
-            self._send_command(0x3C, 0b00110011)  # GS Transition Define A + VSH2 + LUT3
+            self._send_init(0x3C, 0b00110011)  # GS Transition Define A + VSH2 + LUT3
         elif self.border_colour == self.WHITE:
-            self._send_command(0x3C, 0b00110001)  # GS Transition Define A + VSH2 + LUT1
+            self._send_init(0x3C, 0b00110001)  # GS Transition Define A + VSH2 + LUT1
 
         if self.colour == "yellow":
-            self._send_command(0x04, [0x07, 0xAC, 0x32])  # Set voltage of VSH and VSL
+            self._send_init(0x04, [0x07, 0xAC, 0x32])  # Set voltage of VSH and VSL
         if self.colour == "red" and self.resolution == (400, 300):
-            self._send_command(0x04, [0x30, 0xAC, 0x22])
+            self._send_init(0x04, [0x30, 0xAC, 0x22])
 
-        self._send_command(0x32, self._luts[self.lut])  # Set LUTs
+        self._send_init(0x32, self._luts[self.lut])  # Set LUTs
 
-        self._send_command(0x44, [0x00, (self.cols // 8) - 1])  # Set RAM X Start/End
-        self._send_command(0x45, [0x00, 0x00] + packed_height)  # Set RAM Y Start/End
+        self._send_init(0x44, [0x00, (self.cols // 8) - 1])  # Set RAM X Start/End
+        self._send_init(0x45, [0x00, 0x00] + packed_height)  # Set RAM Y Start/End
 
         # 0x24 == RAM B/W, 0x26 == RAM Red/Yellow/etc
         for data in ((0x24, buf_a), (0x26, buf_b)):
@@ -328,13 +340,21 @@ class Inky:
             self._send_command(0x4F, [0x00, 0x00])  # Set RAM Y Pointer Start
             self._send_command(cmd, buf)
 
+    def _refresh(self, busy_wait=True):
+        """Show the frame in display RAM."""
         self._send_command(0x22, 0xC7)  # Display Update Sequence
         self._send_command(0x20)  # Trigger Display Update
         time.sleep(0.05)
 
         if busy_wait:
             self._busy_wait()
-            self._send_command(0x10, 0x01)  # Enter Deep Sleep
+            if not self._session:
+                self._sleep()
+
+    def _sleep(self):
+        """Put the controller into deep sleep, it must be reset to wake."""
+        self._send_command(0x10, 0x01)  # Enter Deep Sleep
+        self._awake = False
 
     def set_pixel(self, x, y, v):
         """Set a single pixel on the buffer.
@@ -345,12 +365,10 @@ class Inky:
         """
         if v in (WHITE, BLACK, RED):
             self.buf[y][x] = v
+            self._mark_dirty(x, y)
 
-    def show(self, busy_wait=True):
-        """Show buffer on display.
-
-        :param bool busy_wait: If True, wait for display update to finish before returning, default: `True`.
-        """
+    def _pack(self):
+        """Flip, rotate and pack the buffer into the display's native format."""
         region = self.buf
 
         if self.v_flip:
@@ -362,10 +380,10 @@ class Inky:
         if self.rotation:
             region = numpy.rot90(region, self.rotation // 90)
 
-        buf_a = numpy.packbits(numpy.where(region == BLACK, 0, 1)).tolist()
-        buf_b = numpy.packbits(numpy.where(region == RED, 1, 0)).tolist()
+        buf_a = numpy.packbits(numpy.where(region == BLACK, 0, 1))
+        buf_b = numpy.packbits(numpy.where(region == RED, 1, 0))
 
-        self._update(buf_a, buf_b, busy_wait=busy_wait)
+        return buf_a, buf_b
 
     def set_border(self, colour):
         """Set the border colour.
@@ -378,7 +396,8 @@ class Inky:
     def set_image(self, image):
         """Copy an image to the buffer.
         """
-        image = image.resize((self.width, self.height))
+        # Decode JPEGs at a reduced scale, if they haven't been loaded yet
+        image = draft(image, (self.width, self.height)).resize((self.width, self.height))
 
         if not image.mode == "P":
             palette_image = Image.new("P", (1, 1))
@@ -392,6 +411,7 @@ class Inky:
             image = image.im.convert("P", True, palette_image.im)
 
         self.buf = numpy.array(image, dtype=numpy.uint8).reshape((self.cols, self.rows))
+        self._mark_dirty(0, 0, self.width, self.height)
 
     def _spi_write(self, dc, values):
         """Write values over SPI.
@@ -401,12 +421,7 @@ class Inky:
         """
         self._gpio.set_value(self.cs_pin, Value.INACTIVE)
         self._gpio.set_value(self.dc_pin, Value.ACTIVE if dc else Value.INACTIVE)
-        try:
-            self._spi_bus.xfer3(values)
-        except AttributeError:
-            for x in range(((len(values) - 1) // _SPI_CHUNK_SIZE) + 1):
-                offset = x * _SPI_CHUNK_SIZE
-                self._spi_bus.xfer(values[offset : offset + _SPI_CHUNK_SIZE])
+        spi.write(self._spi_bus, values, _SPI_CHUNK_SIZE)
 
         self._gpio.set_value(self.cs_pin, Value.ACTIVE)
 
@@ -420,6 +435,12 @@ class Inky:
         self._spi_write(_SPI_COMMAND, [command])
         if data is not None:
             self._send_data(data)
+        self._note_register(command, data)
+
+    def _send_init(self, command, data=None):
+        """Send an init command, unless a session knows its register is already set."""
+        if not self._register_cached(command, data):
+            self._send_command(command, data)
 
     def _send_data(self, data):
         """Send data over SPI.
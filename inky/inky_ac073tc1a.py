@@ -1,14 +1,16 @@
 """Inky e-Ink Display Driver."""
 import time
 import warnings
-from datetime import timedelta
 
 import gpiod
 import gpiodevice
-from gpiod.line import Direction, Edge, Value
-from PIL import Image
+from gpiod.line import Direction, Value
 
-from . import eeprom
+from . import busy, eeprom, spi
+from .base import InkyBase
+from .dither import dither_image
+from .loader import fit_image
+from .palette import blend_palette, get_palette_image
 
 try:
     import numpy
@@ -67,6 +69,9 @@ AC073TC1_CCSET = 0xE0
 AC073TC1_PWS = 0xE3
 AC073TC1_TSSET = 0xE6
 
+# Longest wait (seconds) for BUSY after a reset, see InkyBase._reset()
+_RESET_TIMEOUT = 1.0
+
 _SPI_CHUNK_SIZE = 4096
 _SPI_COMMAND = 0
 _SPI_DATA = 1
@@ -79,7 +84,7 @@ _RESOLUTION = {
 }
 
 
-class Inky:
+class Inky(InkyBase):
     """Inky e-Ink Display Driver."""
 
     BLACK = 0
@@ -116,7 +121,10 @@ class Inky:
         [255, 255, 255]   # Clear
     ]
 
-    def __init__(self, resolution=None, colour="multi", cs_pin=CS0_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None):  # noqa: E501
+    # Colours accepted by set_pixel and the bulk drawing methods
+    _colour_mask = 0x07
+
+    def __init__(self, resolution=None, colour="multi", cs_pin=CS0_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None, spi_port=0):  # noqa: E501
         """Initialise an Inky Display.
 
         :param resolution: (width, height) in pixels, default: (600, 448)
@@ -127,6 +135,7 @@ class Inky:
         :param busy_pin: device busy/wait pin
         :param h_flip: enable horizontal display flip, default: False
         :param v_flip: enable vertical display flip, default: False
+        :param spi_port: SPI bus number, eg: 1 for SPI1, default: 0
 
         """
         self._spi_bus = spi_bus
@@ -160,9 +169,11 @@ class Inky:
         self.dc_pin = dc_pin
         self.reset_pin = reset_pin
         self.busy_pin = busy_pin
+        self._busy = busy.BusyWait(debounce=10, idle_grace=0.1)
         self.cs_pin = cs_pin
+        self.spi_port = spi_port
         try:
-            self.cs_channel = [8, 7].index(cs_pin)
+            self.cs_channel = spi.CS_PINS.get(spi_port, ()).index(cs_pin)
         except ValueError:
             self.cs_channel = 0
         self.h_flip = h_flip
@@ -173,16 +184,9 @@ class Inky:
 
         self._luts = None
 
-    def _palette_blend(self, saturation, dtype="uint8"):
-        saturation = float(saturation)
-        palette = []
-        for i in range(7):
-            rs, gs, bs = [c * saturation for c in self.SATURATED_PALETTE[i]]
-            rd, gd, bd = [c * (1.0 - saturation) for c in self.DESATURATED_PALETTE[i]]
-            if dtype == "uint8":
-                palette += [int(rs + rd), int(gs + gd), int(bs + bd)]
-            if dtype == "uint24":
-                palette += [(int(rs + rd) << 16) | (int(gs + gd) << 8) | int(bs + bd)]
+    @classmethod
+    def _palette_blend(cls, saturation, dtype="uint8"):
+        palette = blend_palette(cls.SATURATED_PALETTE[:7], cls.DESATURATED_PALETTE[:7], saturation, dtype)
         if dtype == "uint8":
             palette += [255, 255, 255]
         if dtype == "uint24":
@@ -210,14 +214,14 @@ class Inky:
                         self.cs_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE),
                         self.dc_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE),
                         self.reset_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE),
-                        self.busy_pin: gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.RISING, debounce_period=timedelta(milliseconds=10))
+                        self.busy_pin: self._busy.line_settings()
                     })
 
             if self._spi_bus is None:
                 import spidev
                 self._spi_bus = spidev.SpiDev()
 
-            self._spi_bus.open(0, self.cs_channel)
+            self._spi_bus.open(self.spi_port, self.cs_channel)
             try:
                 self._spi_bus.no_cs = True
             except OSError:
@@ -226,73 +230,61 @@ class Inky:
 
             self._gpio_setup = True
 
-        self._gpio.set_value(self.reset_pin, Value.INACTIVE)
-        time.sleep(0.1)
-        self._gpio.set_value(self.reset_pin, Value.ACTIVE)
-        time.sleep(0.1)
-
-        self._gpio.set_value(self.reset_pin, Value.INACTIVE)
-        time.sleep(0.1)
-        self._gpio.set_value(self.reset_pin, Value.ACTIVE)
+        if self._needs_reset():
+            # The controller wants two reset pulses, only the second needs a BUSY wait
+            self._gpio.set_value(self.reset_pin, Value.INACTIVE)
+            time.sleep(self._reset_pulse)
+            self._gpio.set_value(self.reset_pin, Value.ACTIVE)
+            time.sleep(self._reset_pulse)
 
-        self._busy_wait(1.0)
+            self._reset(_RESET_TIMEOUT)
+            self._reset_registers()
 
         # Sending init commands to display
-        self._send_command(AC073TC1_CMDH, [0x49, 0x55, 0x20, 0x08, 0x09, 0x18])
+        self._send_init(AC073TC1_CMDH, [0x49, 0x55, 0x20, 0x08, 0x09, 0x18])
 
-        self._send_command(AC073TC1_PWR, [0x3F, 0x00, 0x32, 0x2A, 0x0E, 0x2A])
+        self._send_init(AC073TC1_PWR, [0x3F, 0x00, 0x32, 0x2A, 0x0E, 0x2A])
 
-        self._send_command(AC073TC1_PSR, [0x5F, 0x69])
+        self._send_init(AC073TC1_PSR, [0x5F, 0x69])
 
-        self._send_command(AC073TC1_POFS, [0x00, 0x54, 0x00, 0x44])
+        self._send_init(AC073TC1_POFS, [0x00, 0x54, 0x00, 0x44])
 
-        self._send_command(AC073TC1_BTST1, [0x40, 0x1F, 0x1F, 0x2C])
+        self._send_init(AC073TC1_BTST1, [0x40, 0x1F, 0x1F, 0x2C])
 
-        self._send_command(AC073TC1_BTST2, [0x6F, 0x1F, 0x16, 0x25])
+        self._send_init(AC073TC1_BTST2, [0x6F, 0x1F, 0x16, 0x25])
 
-        self._send_command(AC073TC1_BTST3, [0x6F, 0x1F, 0x1F, 0x22])
+        self._send_init(AC073TC1_BTST3, [0x6F, 0x1F, 0x1F, 0x22])
 
-        self._send_command(AC073TC1_IPC, [0x00, 0x04])
+        self._send_init(AC073TC1_IPC, [0x00, 0x04])
 
-        self._send_command(AC073TC1_PLL, [0x02])
+        self._send_init(AC073TC1_PLL, [0x02])
 
-        self._send_command(AC073TC1_TSE, [0x00])
+        self._send_init(AC073TC1_TSE, [0x00])
 
-        self._send_command(AC073TC1_CDI, [0x3F])
+        self._send_init(AC073TC1_CDI, [0x3F])
 
-        self._send_command(AC073TC1_TCON, [0x02, 0x00])
+        self._send_init(AC073TC1_TCON, [0x02, 0x00])
 
-        self._send_command(AC073TC1_TRES, [0x03, 0x20, 0x01, 0xE0])
+        self._send_init(AC073TC1_TRES, [0x03, 0x20, 0x01, 0xE0])
 
-        self._send_command(AC073TC1_VDCS, [0x1E])
+        self._send_init(AC073TC1_VDCS, [0x1E])
 
-        self._send_command(AC073TC1_T_VDCS, [0x00])
+        self._send_init(AC073TC1_T_VDCS, [0x00])
 
-        self._send_command(AC073TC1_AGID, [0x00])
+        self._send_init(AC073TC1_AGID, [0x00])
 
-        self._send_command(AC073TC1_PWS, [0x2F])
+        self._send_init(AC073TC1_PWS, [0x2F])
 
-        self._send_command(AC073TC1_CCSET, [0x00])
+        self._send_init(AC073TC1_CCSET, [0x00])
 
-        self._send_command(AC073TC1_TSSET, [0x00])
+        self._send_init(AC073TC1_TSSET, [0x00])
+
+        self._awake = True
 
     def _busy_wait(self, timeout=40.0):
-        """Wait for busy/wait pin."""
-        # If the busy_pin is *high* (pulled up by host)
-        # then assume we're not getting a signal from inky
-        # and wait the timeout period to be safe.
-        if self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            warnings.warn("Busy Wait: Held high. Waiting for {:0.2f}s".format(timeout))
-            time.sleep(timeout)
-            return
-
-        event = self._gpio.wait_edge_events(timedelta(seconds=timeout))
-        if not event:
-            warnings.warn(f"Busy Wait: Timed out after {timeout:0.2f}s")
-            return
-
-        for event in self._gpio.read_edge_events():
-            print(timeout, event)
+        """Wait for busy/wait pin, returning the time in seconds the display was busy."""
+        with self._bus_released():
+            return self._busy.wait(self._gpio, self.busy_pin, timeout)
 
     def _update(self, buf):
         """Update display.
@@ -303,21 +295,23 @@ class Inky:
         :param buf_b: Yellow/Red pixels
 
         """
+        self._load(buf)
+        self._refresh()
 
+    def _load(self, buf):
+        """Reset the display and write a frame to its RAM."""
         self.setup()
 
-        # TODO there has to be a better way to force the white colour to be used instead of clear...
-
-        for i in range(len(buf)):
-            if buf[i] & 0xF == 7:
-                buf[i] = (buf[i] & 0xF0) + 1
-                # print buf[i]
-            if buf[i] & 0xF0 == 0x70:
-                buf[i] = (buf[i] & 0xF) + 0x10
-                # print buf[i]
+        # Force the white colour to be used instead of clear, for both packed pixels
+        buf = numpy.asarray(buf, dtype=numpy.uint8)
+        lo = buf & 0x0F
+        hi = buf & 0xF0
+        buf = numpy.where(hi == 0x70, 0x10, hi) | numpy.where(lo == 0x07, 0x01, lo)
 
         self._send_command(AC073TC1_DTM, buf)
 
+    def _refresh(self):
+        """Show the frame in display RAM."""
         self._send_command(AC073TC1_PON)
         self._busy_wait(0.4)
 
@@ -336,13 +330,10 @@ class Inky:
 
         """
         self.buf[y][x] = v & 0x07
+        self._mark_dirty(x, y)
 
-    def show(self, busy_wait=True):
-        """Show buffer on display.
-
-        :param busy_wait: If True, wait for display update to finish before returning.
-
-        """
+    def _pack(self):
+        """Flip, rotate and pack the buffer into the display's native format."""
         region = self.buf
 
         if self.v_flip:
@@ -358,32 +349,39 @@ class Inky:
 
         buf = ((buf[::2] << 4) & 0xF0) | (buf[1::2] & 0x0F)
 
-        self._update(buf.astype("uint8").tolist())
+        return (buf.astype("uint8"),)
 
     def set_border(self, colour):
         """Set the border colour."""
         if colour in (BLACK, WHITE, GREEN, BLUE, RED, YELLOW, ORANGE, CLEAN):
             self.border_colour = colour
 
-    def set_image(self, image, saturation=0.5):
+    def set_image(self, image, saturation=0.5, dither=None, fit=None, resample=None):
         """Copy an image to the display.
 
         :param image: PIL image to copy, must be 600x448
         :param saturation: Saturation for quantization palette - higher value results in a more saturated image
+        :param dither: Dither method from `inky.dither.METHODS`, eg: "bayer8" or "stucki", or None for PIL's Floyd-Steinberg
+        :param fit: Scale images that aren't the display size, "contain", "cover" or "stretch", see `inky.loader.fit_image()`
+        :param resample: PIL resampling filter used by `fit`, defaults to Lanczos
 
         """
+        if fit is not None:
+            image = fit_image(image, (self.width, self.height), fit, resample)
+
         if not image.size == (self.width, self.height):
             raise ValueError("Image must be ({}x{}) pixels!".format(self.width, self.height))
-        if not image.mode == "P":
-            palette = self._palette_blend(saturation)
-            # Image size doesn't matter since it's just the palette we're using
-            palette_image = Image.new("P", (1, 1))
-            # Set our 7 colour palette (+ clear) and zero out the other 247 colours
-            palette_image.putpalette(palette + [0, 0, 0] * 248)
+        if not image.mode == "P" and dither is not None:
+            # Dither against our 7 colour palette (+ clear) with inky.dither
+            image = dither_image(image, self._palette_blend(saturation), dither)
+        elif not image.mode == "P":
+            # Our 7 colour palette (+ clear) with the other 247 colours zeroed out
+            palette_image = get_palette_image(type(self), saturation, pad=True)
             # Force source image data to be loaded for `.im` to work
             image.load()
             image = image.im.convert("P", True, palette_image.im)
         self.buf = numpy.array(image, dtype=numpy.uint8).reshape((self.rows, self.cols))
+        self._mark_dirty(0, 0, self.width, self.height)
 
     def _spi_write(self, dc, values):
         """Write values over SPI.
@@ -398,8 +396,7 @@ class Inky:
         if isinstance(values, str):
             values = [ord(c) for c in values]
 
-        for byte_value in values:
-            self._spi_bus.xfer([byte_value])
+        spi.write(self._spi_bus, values, _SPI_CHUNK_SIZE)
 
         self._gpio.set_value(self.cs_pin, Value.ACTIVE)
 
@@ -413,6 +410,12 @@ class Inky:
         self._spi_write(_SPI_COMMAND, [command])
         if data is not None:
             self._send_data(data)
+        self._note_register(command, data)
+
+    def _send_init(self, command, data=None):
+        """Send an init command, unless a session knows its register is already set."""
+        if not self._register_cached(command, data):
+            self._send_command(command, data)
 
     def _send_data(self, data):
         """Send data over SPI.
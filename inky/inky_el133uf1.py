@@ -1,6 +1,5 @@
 """Inky e-Ink Display Driver."""
-import time
-import warnings
+import functools
 
 import gpiod
 import gpiodevice
@@ -8,7 +7,12 @@ import numpy
 from gpiod.line import Bias, Direction, Value
 from PIL import Image
 
-from . import eeprom
+from . import busy, eeprom, spi
+from .bands import BAND_OVERLAP, convert_bands, process_pool
+from .base import InkyBase
+from .dither import KERNELS, dither_image
+from .loader import fit_image
+from .palette import blend_palette, get_palette_image
 
 BLACK = 0
 WHITE = 1
@@ -87,6 +91,18 @@ EL133UF1_EN_BUF = 0xB6
 EL133UF1_TFT_VCOM_POWER = 0xB1
 EL133UF1_BUCK_BOOST_VDDN = 0xB0
 
+# (settle delay, BUSY timeout) in seconds, see InkyBase._command_timing
+_COMMAND_TIMING = {
+    EL133UF1_PON: (0, 0.2),
+    EL133UF1_DRF: (0, 32.0),
+    EL133UF1_POF: (0, 0.2),
+}
+
+# Longest wait (seconds) for BUSY after a reset, see InkyBase._reset()
+_RESET_TIMEOUT = 0.3
+
+_SPI_CHUNK_SIZE = 4096
+
 _RESOLUTION_13_3_INCH = (1600, 1200)    # Inky Impression 13 (Spectra 6)"
 
 _RESOLUTION = {
@@ -94,7 +110,7 @@ _RESOLUTION = {
 }
 
 
-class Inky:
+class Inky(InkyBase):
     """Inky e-Ink Display Driver."""
 
     BLACK = 0
@@ -125,7 +141,11 @@ class Inky:
         [58, 91, 70],
         [255, 255, 255]]
 
-    def __init__(self, resolution=None, colour="multi", cs_pin_0=CS0_PIN, cs_pin_1=CS1_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None):  # noqa: E501
+    # Colours accepted by set_pixel and the bulk drawing methods
+    _colour_mask = 0x07
+    _command_timing = _COMMAND_TIMING
+
+    def __init__(self, resolution=None, colour="multi", cs_pin_0=CS0_PIN, cs_pin_1=CS1_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None, spi_port=0):  # noqa: E501
         """Initialise an Inky Display.
         :param resolution: (width, height) in pixels, default: (1600, 1200)
         :param colour: one of red, black or yellow, default: black
@@ -135,6 +155,7 @@ class Inky:
         :param busy_pin: device busy/wait pin
         :param h_flip: enable horizontal display flip, default: False
         :param v_flip: enable vertical display flip, default: False
+        :param spi_port: SPI bus number, eg: 1 for SPI1, default: 0
         """
         self._spi_bus = spi_bus
         self._i2c_bus = i2c_bus
@@ -167,11 +188,13 @@ class Inky:
         self.dc_pin = dc_pin
         self.reset_pin = reset_pin
         self.busy_pin = busy_pin
+        self._busy = busy.BusyWait(bias=Bias.PULL_UP, idle_grace=0.1)
         self.cs_pin_0 = cs_pin_0
         self.cs_pin_1 = cs_pin_1
 
+        self.spi_port = spi_port
         try:
-            self.cs_channel = [8, 7].index(cs_pin_0)
+            self.cs_channel = spi.CS_PINS.get(spi_port, ()).index(cs_pin_0)
         except ValueError:
             self.cs_channel = 0
 
@@ -181,17 +204,9 @@ class Inky:
         self._gpio = gpio
         self._gpio_setup = False
 
-    def _palette_blend(self, saturation, dtype="uint8"):
-        saturation = float(saturation)
-        palette = []
-        for i in range(6):
-            rs, gs, bs = [c * saturation for c in self.SATURATED_PALETTE[i]]
-            rd, gd, bd = [c * (1.0 - saturation) for c in self.DESATURATED_PALETTE[i]]
-            if dtype == "uint8":
-                palette += [int(rs + rd), int(gs + gd), int(bs + bd)]
-            if dtype == "uint24":
-                palette += [(int(rs + rd) << 16) | (int(gs + gd) << 8) | int(bs + bd)]
-        return palette
+    @classmethod
+    def _palette_blend(cls, saturation, dtype="uint8"):
+        return blend_palette(cls.SATURATED_PALETTE[:6], cls.DESATURATED_PALETTE[:6], saturation, dtype)
 
     def setup(self):
         """Set up Inky GPIO and reset display."""
@@ -217,7 +232,7 @@ class Inky:
                         self.cs1_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
                         self.dc_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE, bias=Bias.DISABLED),
                         self.reset_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
-                        self.busy_pin: gpiod.LineSettings(direction=Direction.INPUT, bias=Bias.PULL_UP)
+                        self.busy_pin: self._busy.line_settings()
 
                     })
 
@@ -225,77 +240,69 @@ class Inky:
                 import spidev
                 self._spi_bus = spidev.SpiDev()
 
-            self._spi_bus.open(0, self.cs_channel)
+            self._spi_bus.open(self.spi_port, self.cs_channel)
             self._spi_bus.max_speed_hz = 10000000
 
             self._gpio_setup = True
 
-        self._gpio.set_value(self.reset_pin, Value.INACTIVE)
-        time.sleep(0.03)
-        self._gpio.set_value(self.reset_pin, Value.ACTIVE)
-        time.sleep(0.03)
+        if self._needs_reset():
+            self._reset(_RESET_TIMEOUT)
+            self._reset_registers()
 
-        self._busy_wait(0.3)
+        self._send_init(EL133UF1_ANTM, CS0_SEL, [0x00, 0x0C, 0x0C, 0xD9, 0xDD, 0xDD, 0x15, 0x15, 0x55])
 
-        self._send_command(EL133UF1_ANTM, CS0_SEL, [0x00, 0x0C, 0x0C, 0xD9, 0xDD, 0xDD, 0x15, 0x15, 0x55])
+        self._send_init(EL133UF1_CMD66, CS_BOTH_SEL, [0x49, 0x55, 0x13, 0x5D, 0x05, 0x10])
+        self._send_init(EL133UF1_PSR, CS_BOTH_SEL, [0xDF, 0x6B])
+        self._send_init(EL133UF1_DCDC, CS0_SEL, [0x44, 0x54, 0x00])
+        self._send_init(EL133UF1_PLL, CS_BOTH_SEL, [0x08])
+        self._send_init(EL133UF1_CDI, CS_BOTH_SEL, [0x37])
+        self._send_init(EL133UF1_TCON, CS_BOTH_SEL, [0x03, 0x03])
 
-        self._send_command(EL133UF1_CMD66, CS_BOTH_SEL, [0x49, 0x55, 0x13, 0x5D, 0x05, 0x10])
-        self._send_command(EL133UF1_PSR, CS_BOTH_SEL, [0xDF, 0x6B])
-        self._send_command(EL133UF1_DCDC, CS0_SEL, [0x44, 0x54, 0x00])
-        self._send_command(EL133UF1_PLL, CS_BOTH_SEL, [0x08])
-        self._send_command(EL133UF1_CDI, CS_BOTH_SEL, [0x37])
-        self._send_command(EL133UF1_TCON, CS_BOTH_SEL, [0x03, 0x03])
+        self._send_init(EL133UF1_POFS, CS0_SEL, [0x00, 0xC0, 0x03, 0xA8])
+        self._send_init(EL133UF1_POFS, CS1_SEL, [0x00, 0xC0, 0x03, 0x9A])
 
-        self._send_command(EL133UF1_POFS, CS0_SEL, [0x00, 0xC0, 0x03, 0xA8])
-        self._send_command(EL133UF1_POFS, CS1_SEL, [0x00, 0xC0, 0x03, 0x9A])
+        self._send_init(EL133UF1_AGID, CS_BOTH_SEL, [0x10])
+        self._send_init(EL133UF1_PWS, CS_BOTH_SEL, [0x22])
+        self._send_init(EL133UF1_CCSET, CS_BOTH_SEL, [0x01])
+        self._send_init(EL133UF1_TRES, CS_BOTH_SEL, [0x04, 0xB0, 0x03, 0x20])
 
-        self._send_command(EL133UF1_AGID, CS_BOTH_SEL, [0x10])
-        self._send_command(EL133UF1_PWS, CS_BOTH_SEL, [0x22])
-        self._send_command(EL133UF1_CCSET, CS_BOTH_SEL, [0x01])
-        self._send_command(EL133UF1_TRES, CS_BOTH_SEL, [0x04, 0xB0, 0x03, 0x20])
+        self._send_init(EL133UF1_CMDA4, CS0_SEL, [0x03, 0x00, 0x01, 0x03, 0x00, 0x03, 0x00, 0x00, 0x00])
+        self._send_init(EL133UF1_PWR, CS0_SEL, [0x0F, 0x00, 0x28, 0x2C, 0x28, 0x38])
+        self._send_init(EL133UF1_EN_BUF, CS0_SEL, [0x07])
+        self._send_init(EL133UF1_BTST_P, CS0_SEL, [0xE0, 0x20])
+        self._send_init(EL133UF1_BOOST_VDDP_EN, CS0_SEL, [0x01])
+        self._send_init(EL133UF1_BTST_N, CS0_SEL, [0xE0, 0x20])
+        self._send_init(EL133UF1_BUCK_BOOST_VDDN, CS0_SEL, [0x01])
+        self._send_init(EL133UF1_TFT_VCOM_POWER, CS0_SEL, [0x02])
 
-        self._send_command(EL133UF1_CMDA4, CS0_SEL, [0x03, 0x00, 0x01, 0x03, 0x00, 0x03, 0x00, 0x00, 0x00])
-        self._send_command(EL133UF1_PWR, CS0_SEL, [0x0F, 0x00, 0x28, 0x2C, 0x28, 0x38])
-        self._send_command(EL133UF1_EN_BUF, CS0_SEL, [0x07])
-        self._send_command(EL133UF1_BTST_P, CS0_SEL, [0xE0, 0x20])
-        self._send_command(EL133UF1_BOOST_VDDP_EN, CS0_SEL, [0x01])
-        self._send_command(EL133UF1_BTST_N, CS0_SEL, [0xE0, 0x20])
-        self._send_command(EL133UF1_BUCK_BOOST_VDDN, CS0_SEL, [0x01])
-        self._send_command(EL133UF1_TFT_VCOM_POWER, CS0_SEL, [0x02])
+        self._awake = True
 
     def _busy_wait(self, timeout=40.0):
-        """Wait for busy/wait pin."""
-        # If the busy_pin is *high* (pulled up by host)
-        # then assume we're not getting a signal from inky
-        # and wait the timeout period to be safe.
-        if self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            time.sleep(timeout)
-            return
-
-        t_start = time.time()
-        while self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            time.sleep(0.1)
-            if time.time() - t_start > timeout:
-                warnings.warn(f"Busy Wait: Timed out after {timeout:0.2f}s")
-                return
+        """Wait for busy/wait pin, returning the time in seconds the display was busy."""
+        with self._bus_released():
+            return self._busy.wait(self._gpio, self.busy_pin, timeout)
 
     def _update(self, buf_a, buf_b):
         """Update display.
         Dispatches display update to correct driver.
         """
+        self._load(buf_a, buf_b)
+        self._refresh()
+
+    def _load(self, buf_a, buf_b):
+        """Reset the display and write a frame to both controllers' RAM."""
         self.setup()
 
         self._send_command(EL133UF1_DTM, CS0_SEL, buf_a)
         self._send_command(EL133UF1_DTM, CS1_SEL, buf_b)
 
+    def _refresh(self):
+        """Show the frame in display RAM."""
         self._send_command(EL133UF1_PON, CS_BOTH_SEL)
-        self._busy_wait(0.2)
 
         self._send_command(EL133UF1_DRF, CS_BOTH_SEL, [0x00])
-        self._busy_wait(32.0)
 
         self._send_command(EL133UF1_POF, CS_BOTH_SEL, [0x00])
-        self._busy_wait(0.2)
 
     def set_pixel(self, x, y, v):
         """Set a single pixel.
@@ -304,11 +311,10 @@ class Inky:
         :param v: colour to set
         """
         self.buf[y][x] = v & 0x07
+        self._mark_dirty(x, y)
 
-    def show(self, busy_wait=True):
-        """Show buffer on display.
-        :param busy_wait: If True, wait for display update to finish before returning.
-        """
+    def _pack(self):
+        """Flip, rotate and pack the buffer into the display's native format."""
         region = self.buf
 
         if self.v_flip:
@@ -324,32 +330,60 @@ class Inky:
         buf_a = region[:, :600].flatten()
         buf_b = region[:, 600:].flatten()
 
-        buf_a = (((buf_a[::2] << 4) & 0xF0) | (buf_a[1::2] & 0x0F)).astype("uint8").tolist()
-        buf_b = (((buf_b[::2] << 4) & 0xF0) | (buf_b[1::2] & 0x0F)).astype("uint8").tolist()
+        buf_a = (((buf_a[::2] << 4) & 0xF0) | (buf_a[1::2] & 0x0F)).astype("uint8")
+        buf_b = (((buf_b[::2] << 4) & 0xF0) | (buf_b[1::2] & 0x0F)).astype("uint8")
 
-        self._update(buf_a, buf_b)
+        return buf_a, buf_b
 
     def set_border(self, colour):
         """Set the border colour."""
         if colour in (BLACK, WHITE, GREEN, BLUE, RED, YELLOW):
             self.border_colour = colour
 
-    def set_image(self, image, saturation=0.5):
+    def set_image(self, image, saturation=0.5, dither=None, bands=None, fit=None, resample=None):
         """Copy an image to the display.
 
+        The image is converted in horizontal bands, in parallel.
+
         :param image: PIL image to copy, must be 800x480
         :param saturation: Saturation for quantization palette - higher value results in a more saturated image
+        :param dither: Dither method from `inky.dither.METHODS`, eg: "bayer8" or "stucki", or None for PIL's Floyd-Steinberg
+        :param bands: Number of bands, defaults to the number of CPU cores
+        :param fit: Scale images that aren't the display size, "contain", "cover" or "stretch", see `inky.loader.fit_image()`
+        :param resample: PIL resampling filter used by `fit`, defaults to Lanczos
 
         """
+        if fit is not None:
+            image = fit_image(image, (self.width, self.height), fit, resample)
+
         if not image.size == (self.width, self.height):
             raise ValueError(f"Image must be ({self.width}x{self.height}) pixels!")
 
-        dither = Image.Dither.FLOYDSTEINBERG
+        # Remap our sequential palette colours to display native (missing colour 4)
+        remap = numpy.array([0, 1, 2, 3, 5, 6], dtype=numpy.uint8)
+
+        # Convert into a new buffer, so a shared framebuffer is only locked to copy the result
+        buf = numpy.empty_like(self.buf)
+
+        if image.mode != "P" and dither is not None:
+            # Dither against our palette with inky.dither
+            convert = functools.partial(dither_image, palette=self._palette_blend(saturation), method=dither)
+            pixels = numpy.asarray(image.convert("RGB"))
+            if dither in KERNELS:
+                # Error diffusion runs in Python, so needs a process per core
+                convert_bands(convert, pixels, buf, bands, BAND_OVERLAP, process_pool(), remap)
+            else:
+                convert_bands(convert, pixels, buf, bands, remap=remap)
+            self.buf = buf
+            self._mark_dirty(0, 0, self.width, self.height)
+            return
 
-        # Image size doesn't matter since it's just the palette we're using
-        palette_image = Image.new("P", (1, 1))
+        pil_dither = Image.Dither.FLOYDSTEINBERG
 
         if image.mode == "P":
+            # Image size doesn't matter since it's just the palette we're using
+            palette_image = Image.new("P", (1, 1))
+
             # Create a pure colour palette from DESATURATED_PALETTE
             palette = numpy.array(DESATURATED_PALETTE, dtype=numpy.uint8).flatten().tobytes()
             palette_image.putpalette(palette)
@@ -362,22 +396,22 @@ class Inky:
             # Assume that palette mode images with exactly six colours use
             # all the correct colours, but not exactly in the right order.
             if len(image.palette.colors) == 6:
-                dither = Image.Dither.NONE
+                pil_dither = Image.Dither.NONE
         else:
             # All other image should be quantized and dithered
-            palette = self._palette_blend(saturation)
-            palette_image.putpalette(palette)
+            palette_image = get_palette_image(type(self), saturation)
 
-        image = image.convert("RGB").quantize(6, palette=palette_image, dither=dither)
+        def convert(band):
+            return band.quantize(6, palette=palette_image, dither=pil_dither)
 
-        # Remap our sequential palette colours to display native (missing colour 4)
-        remap = numpy.array([0, 1, 2, 3, 5, 6])
-        self.buf = remap[numpy.array(image, dtype=numpy.uint8).reshape((self.rows, self.cols))]
+        # PIL releases the GIL while quantizing, so bands can share a thread pool
+        overlap = BAND_OVERLAP if pil_dither == Image.Dither.FLOYDSTEINBERG else 0
+        convert_bands(convert, image.convert("RGB"), buf, bands, overlap, remap=remap)
+        self.buf = buf
+        self._mark_dirty(0, 0, self.width, self.height)
 
     def _spi_write_bytes(self, data):
-        for x in range(((len(data) - 1) // 4096) + 1):
-            offset = x * 4096
-            self._spi_bus.writebytes(data[offset:offset + 4096])
+        spi.write(self._spi_bus, data, _SPI_CHUNK_SIZE)
 
     def _send_command(self, command, cs_sel=None, data=None):
         """Send command over SPI.
@@ -391,13 +425,24 @@ class Inky:
                 self._gpio.set_value(self.cs1_pin, Value.INACTIVE)
 
             self._gpio.set_value(self.dc_pin, Value.INACTIVE)
-            time.sleep(0.3)
             self._spi_bus.xfer3([command])
 
             if data is not None:
                 self._gpio.set_value(self.dc_pin, Value.ACTIVE)
-                self._spi_bus.xfer3(data)
+                spi.write(self._spi_bus, data, _SPI_CHUNK_SIZE)
 
             self._gpio.set_value(self.cs0_pin, Value.ACTIVE)
             self._gpio.set_value(self.cs1_pin, Value.ACTIVE)
             self._gpio.set_value(self.dc_pin, Value.INACTIVE)
+
+            # Each controller has its own registers
+            for sel in (CS0_SEL, CS1_SEL):
+                if cs_sel & sel:
+                    self._note_register((command, sel), data)
+
+            self._command_done(command)
+
+    def _send_init(self, command, cs_sel, data=None):
+        """Send an init command, unless a session knows its registers are already set."""
+        if not all(self._register_cached((command, sel), data) for sel in (CS0_SEL, CS1_SEL) if cs_sel & sel):
+            self._send_command(command, cs_sel, data)
@@ -1,14 +1,15 @@
 """Inky e-Ink Display Driver."""
-import time
-import warnings
-
 import gpiod
 import gpiodevice
 import numpy
 from gpiod.line import Bias, Direction, Value
 from PIL import Image
 
-from . import eeprom
+from . import busy, eeprom, spi
+from .base import InkyBase
+from .dither import dither_image
+from .loader import fit_image
+from .palette import blend_palette, get_palette_image
 
 BLACK = 0
 WHITE = 1
@@ -56,6 +57,17 @@ Y_ADDR_START_H = 0x00
 Y_ADDR_START_L = 0xFA
 
 
+# (settle delay, BUSY timeout) in seconds, see InkyBase._command_timing
+_COMMAND_TIMING = {
+    JD79661_PON: (0, 40.0),
+    JD79661_DRF: (0, 40.0),
+    JD79661_POF: (0, 40.0),
+    JD79661_DSLP: (0.1, None),
+}
+
+# Longest wait (seconds) for BUSY after a reset, see InkyBase._reset()
+_RESET_TIMEOUT = 0.1
+
 _SPI_CHUNK_SIZE = 4096
 
 _RESOLUTION_2_13_INCH = (250, 122)
@@ -65,7 +77,7 @@ _RESOLUTION = {
 }
 
 
-class Inky:
+class Inky(InkyBase):
     """Inky e-Ink Display Driver."""
 
     BLACK = 0
@@ -88,7 +100,11 @@ class Inky:
         [81, 62, 10],
         [42, 13, 10]]
 
-    def __init__(self, resolution=None, colour="red/yellow", cs_pin=CS_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None):  # noqa: E501
+    # Colours accepted by set_pixel and the bulk drawing methods
+    _valid_colours = (WHITE, BLACK, RED, YELLOW)
+    _command_timing = _COMMAND_TIMING
+
+    def __init__(self, resolution=None, colour="red/yellow", cs_pin=CS_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None, spi_port=0):  # noqa: E501
         """Initialise an Inky Display.
 
         :param resolution: (width, height) in pixels, default: (800, 480)
@@ -99,6 +115,7 @@ class Inky:
         :param busy_pin: device busy/wait pin
         :param h_flip: enable horizontal display flip, default: False
         :param v_flip: enable vertical display flip, default: False
+        :param spi_port: SPI bus number, eg: 1 for SPI1, default: 0
 
         """
         self._spi_bus = spi_bus
@@ -130,9 +147,11 @@ class Inky:
         self.dc_pin = dc_pin
         self.reset_pin = reset_pin
         self.busy_pin = busy_pin
+        self._busy = busy.BusyWait(bias=Bias.PULL_UP, idle_grace=0.1)
         self.cs_pin = cs_pin
+        self.spi_port = spi_port
         try:
-            self.cs_channel = [8, 7].index(cs_pin)
+            self.cs_channel = spi.CS_PINS.get(spi_port, ()).index(cs_pin)
         except ValueError:
             self.cs_channel = 0
         self.h_flip = h_flip
@@ -143,17 +162,9 @@ class Inky:
 
         self._luts = None
 
-    def _palette_blend(self, saturation, dtype="uint8"):
-        saturation = float(saturation)
-        palette = []
-        for i in range(4):
-            rs, gs, bs = [c * saturation for c in self.SATURATED_PALETTE[i]]
-            rd, gd, bd = [c * (1.0 - saturation) for c in self.DESATURATED_PALETTE[i]]
-            if dtype == "uint8":
-                palette += [int(rs + rd), int(gs + gd), int(bs + bd)]
-            if dtype == "uint24":
-                palette += [(int(rs + rd) << 16) | (int(gs + gd) << 8) | int(bs + bd)]
-        return palette
+    @classmethod
+    def _palette_blend(cls, saturation, dtype="uint8"):
+        return blend_palette(cls.SATURATED_PALETTE[:4], cls.DESATURATED_PALETTE[:4], saturation, dtype)
 
     def setup(self):
         """Set up Inky GPIO and reset display."""
@@ -175,53 +186,43 @@ class Inky:
                         self.cs_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
                         self.dc_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE, bias=Bias.DISABLED),
                         self.reset_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
-                        self.busy_pin: gpiod.LineSettings(direction=Direction.INPUT, bias=Bias.PULL_UP)
+                        self.busy_pin: self._busy.line_settings()
                     })
 
             if self._spi_bus is None:
                 import spidev
                 self._spi_bus = spidev.SpiDev()
 
-            self._spi_bus.open(0, self.cs_channel)
+            self._spi_bus.open(self.spi_port, self.cs_channel)
             self._spi_bus.max_speed_hz = 1000000
 
             self._gpio_setup = True
 
-        self._gpio.set_value(self.reset_pin, Value.INACTIVE)
-        time.sleep(0.03)
-        self._gpio.set_value(self.reset_pin, Value.ACTIVE)
-        time.sleep(0.03)
-
-        self._send_command(0x4D, [0x78])
-        self._send_command(JD79661_PSR, [0x0F, 0x29])
-        self._send_command(JD79661_PWR, [0x07, 0x00])
-        self._send_command(JD79661_POFS, [0x10, 0x54, 0x44])
-        self._send_command(JD79661_BTST_P, [0x0F, 0x0A, 0x2F, 0x25, 0x22, 0x2E, 0x21])
-        self._send_command(JD79661_CDI, [0x37])
-        self._send_command(JD79661_TCON, [0x02, 0x02])
-        self._send_command(JD79661_TRES, [X_ADDR_START_H, X_ADDR_START_L, Y_ADDR_START_H, Y_ADDR_START_L])
-        self._send_command(0xE7, [0x1C])
-        self._send_command(JD79661_PWS, [0x22])
-        self._send_command(0xB6, [0x6F])
-        self._send_command(0xB4, [0xD0])
-        self._send_command(0xE9, [0x01])
-        self._send_command(0x30, [0x08])
+        if self._needs_reset():
+            self._reset(_RESET_TIMEOUT)
+            self._reset_registers()
+
+        self._send_init(0x4D, [0x78])
+        self._send_init(JD79661_PSR, [0x0F, 0x29])
+        self._send_init(JD79661_PWR, [0x07, 0x00])
+        self._send_init(JD79661_POFS, [0x10, 0x54, 0x44])
+        self._send_init(JD79661_BTST_P, [0x0F, 0x0A, 0x2F, 0x25, 0x22, 0x2E, 0x21])
+        self._send_init(JD79661_CDI, [0x37])
+        self._send_init(JD79661_TCON, [0x02, 0x02])
+        self._send_init(JD79661_TRES, [X_ADDR_START_H, X_ADDR_START_L, Y_ADDR_START_H, Y_ADDR_START_L])
+        self._send_init(0xE7, [0x1C])
+        self._send_init(JD79661_PWS, [0x22])
+        self._send_init(0xB6, [0x6F])
+        self._send_init(0xB4, [0xD0])
+        self._send_init(0xE9, [0x01])
+        self._send_init(0x30, [0x08])
+
+        self._awake = True
 
     def _busy_wait(self, timeout=40.0):
-        """Wait for busy/wait pin."""
-        # If the busy_pin is *high* (pulled up by host)
-        # then assume we're not getting a signal from inky
-        # and wait the timeout period to be safe.
-        if self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            time.sleep(timeout)
-            return
-
-        t_start = time.time()
-        while not self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            time.sleep(0.1)
-            if time.time() - t_start > timeout:
-                warnings.warn(f"Busy Wait: Timed out after {timeout:0.2f}s")
-                return
+        """Wait for busy/wait pin, returning the time in seconds the display was busy."""
+        with self._bus_released():
+            return self._busy.wait(self._gpio, self.busy_pin, timeout)
 
     def _update(self, buf):
         """Update display.
@@ -229,17 +230,27 @@ class Inky:
         Dispatches display update to correct driver.
 
         """
+        self._load(buf)
+        self._refresh()
+
+    def _load(self, buf):
+        """Reset the display and write a frame to its RAM."""
         self.setup()
 
         self._send_command(JD79661_DTM, buf)
+
+    def _refresh(self):
+        """Show the frame in display RAM."""
         self._send_command(JD79661_PON)
-        self._busy_wait()
         self._send_command(JD79661_DRF, [0x00])
-        self._busy_wait()
         self._send_command(JD79661_POF, [0x00])
-        self._busy_wait()
+        if not self._session:
+            self._sleep()
+
+    def _sleep(self):
+        """Put the controller into deep sleep, it must be reset to wake."""
         self._send_command(JD79661_DSLP, [0xA5])
-        self._busy_wait()
+        self._awake = False
 
     def set_pixel(self, x, y, v):
         """Set a single pixel.
@@ -252,13 +263,10 @@ class Inky:
 
         if v in (WHITE, BLACK, RED, YELLOW):
             self.buf[y][x] = v
+            self._mark_dirty(x, y)
 
-    def show(self, busy_wait=True):
-        """Show buffer on display.
-
-        :param busy_wait: If True, wait for display update to finish before returning.
-
-        """
+    def _pack(self):
+        """Flip, rotate and pack the buffer into the display's native format."""
         region = numpy.vstack((self.overscan, self.buf))
 
         if self.v_flip:
@@ -276,29 +284,41 @@ class Inky:
 
         buf = ((buf[::4] & 0x03) << 6) | ((buf[1::4] & 0x03) << 4) | ((buf[2::4] & 0x03) << 2) | (buf[3::4] & 0x03)
 
-        self._update(buf.astype("uint8").tolist())
+        return (buf.astype("uint8"),)
 
     def set_border(self, colour):
         """Set the border colour."""
         if colour in (BLACK, WHITE, RED, YELLOW):
             self.border_colour = colour
 
-    def set_image(self, image, saturation=0.5):
+    def set_image(self, image, saturation=0.5, dither=None, fit=None, resample=None):
         """Copy an image to the display.
 
         :param image: PIL image to copy, must be 250x122
         :param saturation: Saturation for quantization palette - higher value results in a more saturated image
+        :param dither: Dither method from `inky.dither.METHODS`, eg: "bayer8" or "stucki", or None for PIL's Floyd-Steinberg
+        :param fit: Scale images that aren't the display size, "contain", "cover" or "stretch", see `inky.loader.fit_image()`
+        :param resample: PIL resampling filter used by `fit`, defaults to Lanczos
 
         """
+        if fit is not None:
+            image = fit_image(image, (self.width, self.height), fit, resample)
+
         if not image.size == (self.width, self.height):
             raise ValueError(f"Image must be ({self.width}x{self.height}) pixels!")
 
-        dither = Image.Dither.FLOYDSTEINBERG
+        if image.mode != "P" and dither is not None:
+            # Dither against our palette with inky.dither
+            self.buf = dither_image(image, self._palette_blend(saturation), dither)
+            self._mark_dirty(0, 0, self.width, self.height)
+            return
 
-        # Image size doesn't matter since it's just the palette we're using
-        palette_image = Image.new("P", (1, 1))
+        pil_dither = Image.Dither.FLOYDSTEINBERG
 
         if image.mode == "P":
+            # Image size doesn't matter since it's just the palette we're using
+            palette_image = Image.new("P", (1, 1))
+
             # Create a pure colour palette from DESATURATED_PALETTE
             palette = numpy.array(DESATURATED_PALETTE, dtype=numpy.uint8).flatten().tobytes()
             palette_image.putpalette(palette)
@@ -311,15 +331,15 @@ class Inky:
             # Assume that palette mode images with exactly four colours use
             # all the correct colours, but not exactly in the right order.
             if len(image.palette.colors) == 4:
-                dither = Image.Dither.NONE
+                pil_dither = Image.Dither.NONE
         else:
             # All other image should be quantized and dithered
-            palette = self._palette_blend(saturation)
-            palette_image.putpalette(palette)
+            palette_image = get_palette_image(type(self), saturation)
 
-        image = image.convert("RGB").quantize(4, palette=palette_image, dither=dither)
+        image = image.convert("RGB").quantize(4, palette=palette_image, dither=pil_dither)
 
         self.buf = numpy.array(image, dtype=numpy.uint8).reshape((self.rows, self.cols))
+        self._mark_dirty(0, 0, self.width, self.height)
 
     def _spi_write(self, dc, values):
         """Write values over SPI.
@@ -334,12 +354,7 @@ class Inky:
         if isinstance(values, str):
             values = [ord(c) for c in values]
 
-        try:
-            self._spi_bus.xfer3(values)
-        except AttributeError:
-            for x in range(((len(values) - 1) // _SPI_CHUNK_SIZE) + 1):
-                offset = x * _SPI_CHUNK_SIZE
-                self._spi_bus.xfer(values[offset:offset + _SPI_CHUNK_SIZE])
+        spi.write(self._spi_bus, values, _SPI_CHUNK_SIZE)
 
         self._gpio.set_value(self.cs_pin, Value.ACTIVE)
 
@@ -351,12 +366,20 @@ class Inky:
 
         self._gpio.set_value(self.cs_pin, Value.INACTIVE)
         self._gpio.set_value(self.dc_pin, Value.INACTIVE)
-        time.sleep(0.3)
         self._spi_bus.xfer3([command])
 
         if data is not None:
             self._gpio.set_value(self.dc_pin, Value.ACTIVE)
-            self._spi_bus.xfer3(data)
+            spi.write(self._spi_bus, data, _SPI_CHUNK_SIZE)
 
         self._gpio.set_value(self.cs_pin, Value.ACTIVE)
         self._gpio.set_value(self.dc_pin, Value.INACTIVE)
+
+        self._note_register(command, data)
+
+        self._command_done(command)
+
+    def _send_init(self, command, data=None):
+        """Send an init command, unless a session knows its register is already set."""
+        if not self._register_cached(command, data):
+            self._send_command(command, data)
@@ -1,15 +1,15 @@
 """Inky e-Ink Display Driver."""
-import time
 import warnings
-from datetime import timedelta
 
 import gpiod
 import gpiodevice
 import numpy
-from gpiod.line import Bias, Direction, Edge, Value
+from gpiod.line import Bias, Direction, Value
 from PIL import Image
 
-from . import eeprom, ssd1608
+from . import busy, eeprom, spi, ssd1608
+from .base import InkyBase
+from .loader import draft
 
 WHITE = 0
 BLACK = 1
@@ -23,6 +23,9 @@ MOSI_PIN = 10
 SCLK_PIN = 11
 CS0_PIN = 8
 
+# Longest wait (seconds) for BUSY after a reset, see InkyBase._reset()
+_RESET_TIMEOUT = 0.5
+
 _SPI_CHUNK_SIZE = 4096
 _SPI_COMMAND = 0
 _SPI_DATA = 1
@@ -32,7 +35,7 @@ _RESOLUTION = {
 }
 
 
-class Inky:
+class Inky(InkyBase):
     """Inky e-Ink Display Driver."""
 
     WHITE = 0
@@ -40,7 +43,10 @@ class Inky:
     RED = 2
     YELLOW = 2
 
-    def __init__(self, resolution=(250, 122), colour="black", cs_pin=CS0_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None):  # noqa: E501
+    # Colours accepted by set_pixel and the bulk drawing methods
+    _valid_colours = (WHITE, BLACK, RED)
+
+    def __init__(self, resolution=(250, 122), colour="black", cs_pin=CS0_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None, spi_port=0):  # noqa: E501
         """Initialise an Inky Display.
 
         :param resolution: (width, height) in pixels, default: (400, 300)
@@ -51,6 +57,7 @@ class Inky:
         :param busy_pin: device busy/wait pin
         :param h_flip: enable horizontal display flip, default: False
         :param v_flip: enable vertical display flip, default: False
+        :param spi_port: SPI bus number, eg: 1 for SPI1, default: 0
 
         """
         self._spi_bus = spi_bus
@@ -98,9 +105,11 @@ class Inky:
         self.dc_pin = dc_pin
         self.reset_pin = reset_pin
         self.busy_pin = busy_pin
+        self._busy = busy.BusyWait(busy_value=Value.ACTIVE, debounce=10, raise_on_timeout=True)
         self.cs_pin = cs_pin
+        self.spi_port = spi_port
         try:
-            self.cs_channel = [8, 7].index(cs_pin)
+            self.cs_channel = spi.CS_PINS.get(spi_port, ()).index(cs_pin)
         except ValueError:
             self.cs_channel = 0
         self.h_flip = h_flip
@@ -109,6 +118,9 @@ class Inky:
         self._gpio = gpio
         self._gpio_setup = False
 
+        # Black/White RAM plane of the last update, for partial updates
+        self._shown = None
+
         self._luts = {
             "black": [
                 0x02, 0x02, 0x01, 0x11, 0x12, 0x12, 0x22, 0x22, 0x66, 0x69,
@@ -124,6 +136,11 @@ class Inky:
                 0x02, 0x02, 0x01, 0x11, 0x12, 0x12, 0x22, 0x22, 0x66, 0x69,
                 0x69, 0x59, 0x58, 0x99, 0x99, 0x88, 0x00, 0x00, 0x00, 0x00,
                 0xF8, 0xB4, 0x13, 0x51, 0x35, 0x51, 0x51, 0x19, 0x01, 0x00
+            ],
+            "partial": [
+                0x10, 0x18, 0x18, 0x08, 0x18, 0x18, 0x08, 0x00, 0x00, 0x00,
+                0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+                0x13, 0x14, 0x44, 0x12, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00
             ]
         }
 
@@ -148,7 +165,7 @@ class Inky:
                         self.cs_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
                         self.dc_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE),
                         self.reset_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE),
-                        self.busy_pin: gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.FALLING, debounce_period=timedelta(milliseconds=10))
+                        self.busy_pin: self._busy.line_settings()
                     })
 
             if self._spi_bus is None:
@@ -156,7 +173,7 @@ class Inky:
 
                 self._spi_bus = spidev.SpiDev()
 
-            self._spi_bus.open(0, self.cs_channel)
+            self._spi_bus.open(self.spi_port, self.cs_channel)
             try:
                 self._spi_bus.no_cs = True
             except OSError:
@@ -165,74 +182,98 @@ class Inky:
 
             self._gpio_setup = True
 
-        self._gpio.set_value(self.reset_pin, Value.INACTIVE)
-        time.sleep(0.5)
-        self._gpio.set_value(self.reset_pin, Value.ACTIVE)
-        time.sleep(0.5)
+        if self._needs_reset():
+            self._reset(_RESET_TIMEOUT)
 
-        self._send_command(0x12)  # Soft Reset
-        time.sleep(1.0)
-        self._busy_wait()
+            self._send_command(0x12)  # Soft Reset
+            self._settle(1.0)
+            self._reset_registers()
+
+        self._awake = True
 
     def _busy_wait(self, timeout=5.0):
-        """Wait for busy/wait pin."""
-        if self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            event = self._gpio.wait_edge_events(timedelta(seconds=timeout))
-            if not event:
-                raise RuntimeError("Timeout waiting for busy signal to clear.")
-            for event in self._gpio.read_edge_events():
-                pass
+        """Wait for busy/wait pin, returning the time in seconds the display was busy."""
+        with self._bus_released():
+            return self._busy.wait(self._gpio, self.busy_pin, timeout)
 
-    def _update(self, buf_a, buf_b, busy_wait=True):
+    def _update(self, buf_a, buf_b, window=None, busy_wait=True):
         """Update display.
 
         Dispatches display update to correct driver.
 
         :param buf_a: Black/White pixels
         :param buf_b: Yellow/Red pixels
+        :param window: optional (x0, y0, x1, y1) RAM window for a partial update, x in bytes
 
         """
-        self.setup()
+        self._load(buf_a, buf_b, window)
+        self._refresh()
+
+    def _load(self, buf_a, buf_b, window=None):
+        """Reset the display, unless updating a window, and write a frame to its RAM."""
+        if window is None:
+            self.setup()
+            x0, y0, x1, y1 = 0, 0, self.cols // 8, self.rows
+        else:
+            # Display RAM is retained between updates, so skip the reset and
+            # rewrite only the window.
+            x0, y0, x1, y1 = window
+
+        # A session skips the reset, so a refresh may still be in progress
+        self._busy_wait()
+
+        fast = window is not None and self.colour == "black"
 
-        self._send_command(ssd1608.DRIVER_CONTROL, [self.rows - 1, (self.rows - 1) >> 8, 0x00])
+        self._send_init(ssd1608.DRIVER_CONTROL, [self.rows - 1, (self.rows - 1) >> 8, 0x00])
         # Set dummy line period
-        self._send_command(ssd1608.WRITE_DUMMY, [0x1B])
+        self._send_init(ssd1608.WRITE_DUMMY, [0x1B])
         # Set Line Width
-        self._send_command(ssd1608.WRITE_GATELINE, [0x0B])
+        self._send_init(ssd1608.WRITE_GATELINE, [0x0B])
         # Data entry sequence (scan direction leftward and downward)
-        self._send_command(ssd1608.DATA_MODE, [0x03])
+        self._send_init(ssd1608.DATA_MODE, [0x03])
         # Set ram X start and end position
-        xposBuf = [0x00, self.cols // 8 - 1]
-        self._send_command(ssd1608.SET_RAMXPOS, xposBuf)
+        xposBuf = [x0, x1 - 1]
+        self._send_init(ssd1608.SET_RAMXPOS, xposBuf)
         # Set ram Y start and end position
-        yposBuf = [0x00, 0x00, (self.rows - 1) & 0xFF, (self.rows - 1) >> 8]
-        self._send_command(ssd1608.SET_RAMYPOS, yposBuf)
+        yposBuf = [y0 & 0xFF, y0 >> 8, (y1 - 1) & 0xFF, (y1 - 1) >> 8]
+        self._send_init(ssd1608.SET_RAMYPOS, yposBuf)
         # VCOM Voltage
-        self._send_command(ssd1608.WRITE_VCOM, [0x70])
+        self._send_init(ssd1608.WRITE_VCOM, [0x70])
         # Write LUT DATA
-        self._send_command(ssd1608.WRITE_LUT, self._luts[self.lut])
+        self._send_init(ssd1608.WRITE_LUT, self._luts["partial" if fast else self.lut])
 
         if self.border_colour == self.BLACK:
-            self._send_command(ssd1608.WRITE_BORDER, 0b00000000)
+            self._send_init(ssd1608.WRITE_BORDER, 0b00000000)
             # GS Transition + Waveform 00 + GSA 0 + GSB 0
         elif self.border_colour == self.RED and self.colour == "red":
-            self._send_command(ssd1608.WRITE_BORDER, 0b00000110)
+            self._send_init(ssd1608.WRITE_BORDER, 0b00000110)
             # GS Transition + Waveform 01 + GSA 1 + GSB 0
         elif self.border_colour == self.YELLOW and self.colour == "yellow":
-            self._send_command(ssd1608.WRITE_BORDER, 0b00001111)
+            self._send_init(ssd1608.WRITE_BORDER, 0b00001111)
             # GS Transition + Waveform 11 + GSA 1 + GSB 1
         elif self.border_colour == self.WHITE:
-            self._send_command(ssd1608.WRITE_BORDER, 0b00000001)
+            self._send_init(ssd1608.WRITE_BORDER, 0b00000001)
             # GS Transition + Waveform 00 + GSA 0 + GSB 1
 
-        # Set RAM address to 0, 0
-        self._send_command(ssd1608.SET_RAMXCOUNT, [0x00])
-        self._send_command(ssd1608.SET_RAMYCOUNT, [0x00, 0x00])
+        # Set RAM address to the start of the window
+        self._send_command(ssd1608.SET_RAMXCOUNT, [x0])
+        self._send_command(ssd1608.SET_RAMYCOUNT, [y0 & 0xFF, y0 >> 8])
+
+        if fast:
+            # The fast waveform drives each pixel from its previous value
+            buf_b = self._shown[y0:y1, x0:x1]
 
         for data in ((ssd1608.WRITE_RAM, buf_a), (ssd1608.WRITE_ALTRAM, buf_b)):
             cmd, buf = data
             self._send_command(cmd, buf)
 
+        if window is None:
+            self._shown = numpy.reshape(buf_a, (self.rows, self.cols // 8))
+        else:
+            self._shown[y0:y1, x0:x1] = numpy.reshape(buf_a, (y1 - y0, x1 - x0))
+
+    def _refresh(self):
+        """Show the frame in display RAM."""
         self._busy_wait()
         self._send_command(ssd1608.MASTER_ACTIVATE)
 
@@ -246,15 +287,10 @@ class Inky:
         """
         if v in (WHITE, BLACK, RED):
             self.buf[y][x] = v
+            self._mark_dirty(x - self.offset_x, y - self.offset_y)
 
-    def show(self, busy_wait=True):
-        """Show buffer on display.
-
-        :param busy_wait: If True, wait for display update to finish before returning.
-
-        """
-        region = self.buf
-
+    def _transform(self, region):
+        """Apply flips and rotation to map a buffer onto display RAM."""
         if self.v_flip:
             region = numpy.fliplr(region)
 
@@ -264,10 +300,72 @@ class Inky:
         if self.rotation:
             region = numpy.rot90(region, self.rotation // 90)
 
-        buf_a = numpy.packbits(numpy.where(region == BLACK, 0, 1)).tolist()
-        buf_b = numpy.packbits(numpy.where(region == RED, 1, 0)).tolist()
+        return region
+
+    def _window(self, region):
+        """Map a display region to a byte aligned RAM window.
+
+        :param region: (x, y, w, h) area of the display in pixels
+
+        Returns (x0, y0, x1, y1) with x in bytes.
+
+        """
+        x, y, w, h = region
+        x += self.offset_x
+        y += self.offset_y
+
+        mask = numpy.zeros(self.buf.shape, dtype=bool)
+        mask[max(0, y):max(0, y + h), max(0, x):max(0, x + w)] = True
+        rows, cols = numpy.nonzero(self._transform(mask))
 
-        self._update(buf_a, buf_b, busy_wait=busy_wait)
+        if len(rows) == 0:
+            raise ValueError("Region {}x{} at {},{} is outside the display!".format(w, h, *region[:2]))
+
+        return int(cols.min() // 8), int(rows.min()), int(cols.max() // 8 + 1), int(rows.max() + 1)
+
+    def _pack(self, region=None):
+        """Flip, rotate and pack the buffer into the display's native format.
+
+        :param region: optional (x, y, w, h) area of the display to pack for a partial update,
+            or "dirty" for the area drawn to since the last update
+
+        """
+        if region == "dirty":
+            region = self.dirty_region()
+
+        buf = self._transform(self.buf)
+
+        buf_a = numpy.packbits(numpy.where(buf == BLACK, 0, 1), axis=1)
+        buf_b = numpy.packbits(numpy.where(buf == RED, 1, 0), axis=1)
+
+        # The first update after start-up has to fill the whole RAM
+        if region is None or self._shown is None:
+            return buf_a.ravel(), buf_b.ravel()
+
+        x0, y0, x1, y1 = window = self._window(region)
+
+        return buf_a[y0:y1, x0:x1].ravel(), buf_b[y0:y1, x0:x1].ravel(), window
+
+    def show(self, busy_wait=True, force=False, region=None):
+        """Show buffer on display.
+
+        :param busy_wait: If True, wait for display update to finish before returning.
+        :param force: If True, refresh the display even if the frame has not changed.
+        :param region: optional (x, y, w, h) area to update, or "dirty" for the area drawn to since the last update.
+            Only the bytes covering this area are sent, and black/white displays use a fast partial refresh waveform.
+
+        """
+        super().show(busy_wait, force=force, region=region)
+
+    def show_async(self, force=False, region=None, edge_wait=None):
+        """Show buffer on display without waiting for the refresh to finish.
+
+        :param force: If True, refresh the display even if the frame has not changed.
+        :param region: optional (x, y, w, h) area to update, see `show`.
+        :param edge_wait: optional replacement for the blocking wait on BUSY edge events, see `InkyBase.show_async`.
+
+        """
+        return super().show_async(force=force, edge_wait=edge_wait, region=region)
 
     def set_border(self, colour):
         """Set the border colour."""
@@ -276,7 +374,8 @@ class Inky:
 
     def set_image(self, image):
         """Copy an image to the display."""
-        image = image.resize((self.width, self.height))
+        # Decode JPEGs at a reduced scale, if they haven't been loaded yet
+        image = draft(image, (self.width, self.height)).resize((self.width, self.height))
 
         if not image.mode == "P":
             palette_image = Image.new("P", (1, 1))
@@ -293,6 +392,7 @@ class Inky:
         width, height = image.size
         canvas.paste(image, (self.offset_x, self.offset_y, width + self.offset_x, height + self.offset_y))
         self.buf = numpy.array(canvas, dtype=numpy.uint8).reshape((self.cols, self.rows))
+        self._mark_dirty(0, 0, self.width, self.height)
 
     def _spi_write(self, dc, values):
         """Write values over SPI.
@@ -303,12 +403,7 @@ class Inky:
         """
         self._gpio.set_value(self.cs_pin, Value.INACTIVE)
         self._gpio.set_value(self.dc_pin, Value.ACTIVE if dc else Value.INACTIVE)
-        try:
-            self._spi_bus.xfer3(values)
-        except AttributeError:
-            for x in range(((len(values) - 1) // _SPI_CHUNK_SIZE) + 1):
-                offset = x * _SPI_CHUNK_SIZE
-                self._spi_bus.xfer(values[offset : offset + _SPI_CHUNK_SIZE])
+        spi.write(self._spi_bus, values, _SPI_CHUNK_SIZE)
 
         self._gpio.set_value(self.cs_pin, Value.ACTIVE)
 
@@ -322,6 +417,12 @@ class Inky:
         self._spi_write(_SPI_COMMAND, [command])
         if data is not None:
             self._send_data(data)
+        self._note_register(command, data)
+
+    def _send_init(self, command, data=None):
+        """Send an init command, unless a session knows its register is already set."""
+        if not self._register_cached(command, data):
+            self._send_command(command, data)
 
     def _send_data(self, data):
         """Send data over SPI.
@@ -1,16 +1,17 @@
 """Inky e-Ink Display Driver."""
 import struct
-import time
 import warnings
-from datetime import timedelta
 
 import gpiod
 import gpiodevice
 import numpy
-from gpiod.line import Bias, Direction, Edge, Value
-from PIL import Image
+from gpiod.line import Bias, Direction, Value
 
-from . import eeprom
+from . import busy, eeprom, spi
+from .base import InkyBase
+from .dither import dither_image
+from .loader import fit_image
+from .palette import blend_palette, get_palette_image
 
 BLACK = 0
 WHITE = 1
@@ -80,6 +81,9 @@ UC8159_VDCS = 0x82
 UC8159_PWS = 0xE3
 UC8159_TSSET = 0xE5
 
+# Longest wait (seconds) for BUSY after a reset, see InkyBase._reset()
+_RESET_TIMEOUT = 1.0
+
 _SPI_CHUNK_SIZE = 4096
 _SPI_COMMAND = 0
 _SPI_DATA = 1
@@ -93,7 +97,7 @@ _RESOLUTION = {
 }
 
 
-class Inky:
+class Inky(InkyBase):
     """Inky e-Ink Display Driver."""
 
     BLACK = 0
@@ -128,7 +132,10 @@ class Inky:
         [177, 106, 73],
         [255, 255, 255]]
 
-    def __init__(self, resolution=None, colour="multi", cs_pin=CS0_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None):  # noqa: E501
+    # Colours accepted by set_pixel and the bulk drawing methods
+    _colour_mask = 0x07
+
+    def __init__(self, resolution=None, colour="multi", cs_pin=CS0_PIN, dc_pin=DC_PIN, reset_pin=RESET_PIN, busy_pin=BUSY_PIN, h_flip=False, v_flip=False, spi_bus=None, i2c_bus=None, gpio=None, spi_port=0):  # noqa: E501
         """Initialise an Inky Display.
 
         :param resolution: (width, height) in pixels, default: (600, 448)
@@ -139,6 +146,7 @@ class Inky:
         :param busy_pin: device busy/wait pin
         :param h_flip: enable horizontal display flip, default: False
         :param v_flip: enable vertical display flip, default: False
+        :param spi_port: SPI bus number, eg: 1 for SPI1, default: 0
 
         """
         self._spi_bus = spi_bus
@@ -173,9 +181,11 @@ class Inky:
         self.dc_pin = dc_pin
         self.reset_pin = reset_pin
         self.busy_pin = busy_pin
+        self._busy = busy.BusyWait(debounce=10, bias=Bias.DISABLED, idle_grace=0.1)
         self.cs_pin = cs_pin
+        self.spi_port = spi_port
         try:
-            self.cs_channel = [8, 7].index(cs_pin)
+            self.cs_channel = spi.CS_PINS.get(spi_port, ()).index(cs_pin)
         except ValueError:
             self.cs_channel = 0
         self.h_flip = h_flip
@@ -186,16 +196,9 @@ class Inky:
 
         self._luts = None
 
-    def _palette_blend(self, saturation, dtype="uint8"):
-        saturation = float(saturation)
-        palette = []
-        for i in range(7):
-            rs, gs, bs = [c * saturation for c in self.SATURATED_PALETTE[i]]
-            rd, gd, bd = [c * (1.0 - saturation) for c in self.DESATURATED_PALETTE[i]]
-            if dtype == "uint8":
-                palette += [int(rs + rd), int(gs + gd), int(bs + bd)]
-            if dtype == "uint24":
-                palette += [(int(rs + rd) << 16) | (int(gs + gd) << 8) | int(bs + bd)]
+    @classmethod
+    def _palette_blend(cls, saturation, dtype="uint8"):
+        palette = blend_palette(cls.SATURATED_PALETTE[:7], cls.DESATURATED_PALETTE[:7], saturation, dtype)
         if dtype == "uint8":
             palette += [255, 255, 255]
         if dtype == "uint24":
@@ -222,14 +225,14 @@ class Inky:
                         self.cs_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
                         self.dc_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE, bias=Bias.DISABLED),
                         self.reset_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.ACTIVE, bias=Bias.DISABLED),
-                        self.busy_pin: gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.RISING, debounce_period=timedelta(milliseconds=10), bias=Bias.DISABLED)
+                        self.busy_pin: self._busy.line_settings()
                     })
 
             if self._spi_bus is None:
                 import spidev
                 self._spi_bus = spidev.SpiDev()
 
-            self._spi_bus.open(0, self.cs_channel)
+            self._spi_bus.open(self.spi_port, self.cs_channel)
             try:
                 self._spi_bus.no_cs = True
             except OSError:
@@ -238,18 +241,15 @@ class Inky:
 
             self._gpio_setup = True
 
-        self._gpio.set_value(self.reset_pin, Value.INACTIVE)
-        time.sleep(0.1)
-        self._gpio.set_value(self.reset_pin, Value.ACTIVE)
-        time.sleep(0.1)
-
-        self._busy_wait(1.0)
+        if self._needs_reset():
+            self._reset(_RESET_TIMEOUT)
+            self._reset_registers()
 
         # Resolution Setting
         # 10bit horizontal followed by a 10bit vertical resolution
         # we'll let struct.pack do the work here and send 16bit values
         # life is too short for manual bit wrangling
-        self._send_command(
+        self._send_init(
             UC8159_TRES,
             struct.pack(">HH", self.width, self.height))
 
@@ -263,7 +263,7 @@ class Inky:
         # 0b00000001 = Soft reset, 0 = Reset, 1 = Normal (Default)
         # 0b11 = 600x448
         # 0b10 = 640x400
-        self._send_command(
+        self._send_init(
             UC8159_PSR,
             [
                 (self.resolution_setting << 6) | 0b101111,  # See above for more magic numbers
@@ -272,7 +272,7 @@ class Inky:
         )
 
         # Power Settings
-        self._send_command(
+        self._send_init(
             UC8159_PWR,
             [
                 (0x06 << 3) |  # ??? - not documented in UC8159 datasheet  # noqa: W504
@@ -292,54 +292,42 @@ class Inky:
         # PLL = 2MHz * (M / N)
         # PLL = 2MHz * (7 / 4)
         # PLL = 2,800,000 ???
-        self._send_command(UC8159_PLL, [0x3C])  # 0b00111100
+        self._send_init(UC8159_PLL, [0x3C])  # 0b00111100
 
         # Send the TSE register to the display
-        self._send_command(UC8159_TSE, [0x00])  # Colour
+        self._send_init(UC8159_TSE, [0x00])  # Colour
 
         # VCOM and Data Interval setting
         # 0b11100000 = Vborder control (0b001 = LUTB voltage)
         # 0b00010000 = Data polarity
         # 0b00001111 = Vcom and data interval (0b0111 = 10, default)
         cdi = (self.border_colour << 5) | 0x17
-        self._send_command(UC8159_CDI, [cdi])  # 0b00110111
+        self._send_init(UC8159_CDI, [cdi])  # 0b00110111
 
         # Gate/Source non-overlap period
         # 0b11110000 = Source to Gate (0b0010 = 12nS, default)
         # 0b00001111 = Gate to Source
-        self._send_command(UC8159_TCON, [0x22])  # 0b00100010
+        self._send_init(UC8159_TCON, [0x22])  # 0b00100010
 
         # Disable external flash
-        self._send_command(UC8159_DAM, [0x00])
+        self._send_init(UC8159_DAM, [0x00])
 
         # UC8159_7C
-        self._send_command(UC8159_PWS, [0xAA])
+        self._send_init(UC8159_PWS, [0xAA])
 
         # Power off sequence
         # 0b00110000 = power off sequence of VDH and VDL, 0b00 = 1 frame (default)
         # All other bits ignored?
-        self._send_command(
+        self._send_init(
             UC8159_PFS, [0x00]  # PFS_1_FRAME
         )
 
+        self._awake = True
+
     def _busy_wait(self, timeout=40.0):
-        """Wait for busy/wait pin."""
-        # If the busy_pin is *high* (pulled up by host)
-        # then assume we're not getting a signal from inky
-        # and wait the timeout period to be safe.
-        if self._gpio.get_value(self.busy_pin) == Value.ACTIVE:
-            warnings.warn(f"Busy Wait: Held high. Waiting for {timeout:0.2f}s")
-            time.sleep(timeout)
-            return
-
-        event = self._gpio.wait_edge_events(timedelta(seconds=timeout))
-        if not event:
-            warnings.warn(f"Busy Wait: Timed out after {timeout:0.2f}s")
-            return
-
-        for event in self._gpio.read_edge_events():
-            if event.Type == Edge.RISING:
-                return
+        """Wait for busy/wait pin, returning the time in seconds the display was busy."""
+        with self._bus_released():
+            return self._busy.wait(self._gpio, self.busy_pin, timeout)
 
     def _update(self, buf):
         """Update display.
@@ -347,9 +335,16 @@ class Inky:
         Dispatches display update to correct driver.
 
         """
+        self._load(buf)
+        self._refresh()
+
+    def _load(self, buf):
+        """Reset the display and write a frame to its RAM."""
         self.setup()
         self._send_command(UC8159_DTM1, buf)
 
+    def _refresh(self):
+        """Show the frame in display RAM."""
         self._send_command(UC8159_PON)
         self._busy_wait(0.2)
 
@@ -368,13 +363,10 @@ class Inky:
 
         """
         self.buf[y][x] = v & 0x07
+        self._mark_dirty(x, y)
 
-    def show(self, busy_wait=True):
-        """Show buffer on display.
-
-        :param busy_wait: If True, wait for display update to finish before returning.
-
-        """
+    def _pack(self):
+        """Flip, rotate and pack the buffer into the display's native format."""
         region = self.buf
 
         if self.v_flip:
@@ -390,32 +382,39 @@ class Inky:
 
         buf = ((buf[::2] << 4) & 0xF0) | (buf[1::2] & 0x0F)
 
-        self._update(buf.astype("uint8").tolist())
+        return (buf.astype("uint8"),)
 
     def set_border(self, colour):
         """Set the border colour."""
         if colour in (BLACK, WHITE, GREEN, BLUE, RED, YELLOW, ORANGE, CLEAN):
             self.border_colour = colour
 
-    def set_image(self, image, saturation=0.5):
+    def set_image(self, image, saturation=0.5, dither=None, fit=None, resample=None):
         """Copy an image to the display.
 
         :param image: PIL image to copy, must be 600x448
         :param saturation: Saturation for quantization palette - higher value results in a more saturated image
+        :param dither: Dither method from `inky.dither.METHODS`, eg: "bayer8" or "stucki", or None for PIL's Floyd-Steinberg
+        :param fit: Scale images that aren't the display size, "contain", "cover" or "stretch", see `inky.loader.fit_image()`
+        :param resample: PIL resampling filter used by `fit`, defaults to Lanczos
 
         """
+        if fit is not None:
+            image = fit_image(image, (self.width, self.height), fit, resample)
+
         if not image.size == (self.width, self.height):
             raise ValueError(f"Image must be ({self.width}x{self.height}) pixels!")
-        if not image.mode == "P":
-            palette = self._palette_blend(saturation)
-            # Image size doesn't matter since it's just the palette we're using
-            palette_image = Image.new("P", (1, 1))
-            # Set our 7 colour palette (+ clear) and zero out the other 247 colours
-            palette_image.putpalette(palette + [0, 0, 0] * 248)
+        if not image.mode == "P" and dither is not None:
+            # Dither against our 7 colour palette (+ clear) with inky.dither
+            image = dither_image(image, self._palette_blend(saturation), dither)
+        elif not image.mode == "P":
+            # Our 7 colour palette (+ clear) with the other 247 colours zeroed out
+            palette_image = get_palette_image(type(self), saturation, pad=True)
             # Force source image data to be loaded for `.im` to work
             image.load()
             image = image.im.convert("P", True, palette_image.im)
         self.buf = numpy.array(image, dtype=numpy.uint8).reshape((self.rows, self.cols))
+        self._mark_dirty(0, 0, self.width, self.height)
 
     def _spi_write(self, dc, values):
         """Write values over SPI.
@@ -430,12 +429,7 @@ class Inky:
         if isinstance(values, str):
             values = [ord(c) for c in values]
 
-        try:
-            self._spi_bus.xfer3(values)
-        except AttributeError:
-            for x in range(((len(values) - 1) // _SPI_CHUNK_SIZE) + 1):
-                offset = x * _SPI_CHUNK_SIZE
-                self._spi_bus.xfer(values[offset : offset + _SPI_CHUNK_SIZE])
+        spi.write(self._spi_bus, values, _SPI_CHUNK_SIZE)
 
         self._gpio.set_value(self.cs_pin, Value.ACTIVE)
 
@@ -449,6 +443,12 @@ class Inky:
         self._spi_write(_SPI_COMMAND, [command])
         if data is not None:
             self._send_data(data)
+        self._note_register(command, data)
+
+    def _send_init(self, command, data=None):
+        """Send an init command, unless a session knows its register is already set."""
+        if not self._register_cached(command, data):
+            self._send_command(command, data)
 
     def _send_data(self, data):
         """Send data over SPI.
@@ -0,0 +1,119 @@
+"""Image loading for Inky, scaled to fit the display as cheaply as possible.
+
+JPEG files can be decoded at 1/2, 1/4 or 1/8 scale straight from their DCT
+coefficients. A 12 megapixel photo shown on an 800x480 display only needs
+decoding at 1/4 or 1/8 scale, which is several times faster and needs a
+fraction of the memory of a full resolution decode.
+
+"""
+import math
+
+import numpy
+from PIL import ExifTags, Image, ImageColor, ImageOps
+
+# EXIF orientations which swap width and height
+_TRANSPOSED = (5, 6, 7, 8)
+
+FITS = ("contain", "cover", "stretch")
+
+
+def draft(image, size):
+    """Ask a JPEG to decode at the smallest scale that is still at least `size`.
+
+    Only affects images which have not been loaded yet, and changes their
+    `size` in place. Other images are returned untouched.
+
+    :param image: PIL image, eg: from `Image.open()`
+    :param size: (width, height) the image will be resized to, once EXIF rotation is applied
+
+    """
+    if getattr(image, "format", None) != "JPEG":
+        return image
+
+    width, height = size
+    if image.getexif().get(ExifTags.Base.Orientation) in _TRANSPOSED:
+        width, height = height, width
+
+    image.draft(None, (width, height))
+    return image
+
+
+def fit_image(image, size, fit="contain", resample=None, background="white"):
+    """Scale an image to `size` with a single resample.
+
+    :param image: PIL image
+    :param size: (width, height) in pixels, eg: `display.resolution`
+    :param fit: "contain" to fit the whole image, padding with `background`,
+        "cover" to fill the display, cropping the image, or "stretch" to ignore the aspect ratio
+    :param resample: PIL resampling filter, defaults to Lanczos
+    :param background: colour around a "contained" image
+
+    """
+    if fit not in FITS:
+        raise ValueError("Unsupported fit: {}, must be one of {}".format(fit, ", ".join(FITS)))
+
+    if resample is None:
+        resample = Image.Resampling.LANCZOS
+
+    width, height = size = tuple(size)
+    scale_x, scale_y = width / image.width, height / image.height
+    if fit == "contain":
+        scale_x = scale_y = min(scale_x, scale_y)
+    elif fit == "cover":
+        scale_x = scale_y = max(scale_x, scale_y)
+
+    # Decode JPEGs at the smallest scale that still covers the scaled image
+    if getattr(image, "format", None) == "JPEG":
+        original_w, original_h = image.size
+        image.draft(None, (math.ceil(original_w * scale_x), math.ceil(original_h * scale_y)))
+        scale_x, scale_y = scale_x * original_w / image.width, scale_y * original_h / image.height
+
+    if image.size == size:
+        return image
+
+    if fit == "stretch":
+        return image.resize(size, resample)
+
+    if fit == "cover":
+        # Crop the middle of the image, as part of the resample
+        crop_w, crop_h = width / scale_x, height / scale_y
+        left, top = (image.width - crop_w) / 2, (image.height - crop_h) / 2
+        return image.resize(size, resample, box=(left, top, left + crop_w, top + crop_h))
+
+    scaled = (max(1, min(width, round(image.width * scale_x))), max(1, min(height, round(image.height * scale_y))))
+    canvas = _canvas(image, size, background)
+    canvas.paste(image.resize(scaled, resample), ((width - scaled[0]) // 2, (height - scaled[1]) // 2))
+    return canvas
+
+
+def load_image(source, size, resample=None, fit="stretch"):
+    """Open an image and resize it to `size`.
+
+    JPEGs are decoded at a reduced scale where possible, and EXIF rotation is applied.
+
+    :param source: filename, file object or PIL image
+    :param size: (width, height) in pixels, eg: `display.resolution`
+    :param resample: PIL resampling filter, defaults to Lanczos
+    :param fit: "contain", "cover" or "stretch", see `fit_image()`
+
+    """
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    image = ImageOps.exif_transpose(draft(image, size))
+    return fit_image(image, size, fit, resample)
+
+
+def _canvas(image, size, background):
+    """Create a blank image, like `image`, filled with `background`."""
+    if image.mode != "P":
+        return Image.new(image.mode, size, background)
+
+    # Palette images are filled with the nearest colour in their palette
+    palette = image.getpalette() or [0, 0, 0]
+    if isinstance(background, str):
+        background = ImageColor.getrgb(background)
+    colours = numpy.array(palette).reshape((-1, 3))
+    index = int(numpy.square(colours - background[:3]).sum(axis=1).argmin())
+
+    canvas = Image.new("P", size, index)
+    canvas.putpalette(palette)
+    return canvas
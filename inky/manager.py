@@ -0,0 +1,86 @@
+"""Drive several Inky displays from one process.
+
+Each display is a normal driver instance with its own SPI bus, chip-select
+and pins, and updates on its own worker. Displays sharing a bus take turns
+with it, but only while they are sending: a display waiting for BUSY, eg:
+during its refresh, lets the next one send its frame. So a group of panels
+refreshes in about one refresh time plus the transfers, on any mix of buses.
+
+    from inky import inky_e673
+    from inky.manager import DisplayManager
+
+    wall = DisplayManager()
+    wall.add("left", inky_e673.Inky, spi_port=0, cs_pin=8, reset_pin=27, busy_pin=17)
+    wall.add("right", inky_e673.Inky, spi_port=1, cs_pin=18, reset_pin=23, busy_pin=24)
+
+    wall["left"].set_image(left_image)
+    wall["right"].set_image(right_image)
+    wall.show()
+
+"""
+
+
+class DisplayManager:
+    """A group of displays, updated together."""
+
+    def __init__(self):
+        """Initialise an empty display group."""
+        self.displays = {}
+
+    def add(self, name, display, **kwargs):
+        """Add a display to the group, returning it.
+
+        :param name: name to look the display up by, eg: `manager["left"]`
+        :param display: driver instance, or driver class to create with `kwargs`
+        :param kwargs: driver arguments, eg: `spi_port`, `cs_pin`, `dc_pin`, `reset_pin` and `busy_pin`
+
+        """
+        if name in self.displays:
+            raise ValueError("Display {} already added!".format(name))
+        if isinstance(display, type):
+            display = display(**kwargs)
+        elif kwargs:
+            raise ValueError("Driver arguments need a driver class, not an instance!")
+        self.displays[name] = display
+        return display
+
+    def __getitem__(self, name):
+        return self.displays[name]
+
+    def __iter__(self):
+        return iter(self.displays)
+
+    def __len__(self):
+        return len(self.displays)
+
+    def show_async(self, names=None, force=False):
+        """Show the buffers of several displays without waiting for them to refresh.
+
+        Every buffer is packed before this returns, so it is safe to start
+        drawing the next frames straight away.
+
+        :param names: displays to show, default: all of them
+        :param force: If True, refresh displays even if their frames have not changed.
+
+        Returns a dict of name: :class:`concurrent.futures.Future`.
+
+        """
+        names = self.displays if names is None else names
+        return {name: self.displays[name].show_async(force=force) for name in names}
+
+    def show(self, names=None, busy_wait=True, force=False):
+        """Show the buffers of several displays.
+
+        :param names: displays to show, default: all of them
+        :param busy_wait: If True, wait for every display to finish refreshing before returning.
+            If an update failed, its exception is raised once all of them are done.
+        :param force: If True, refresh displays even if their frames have not changed.
+
+        """
+        futures = self.show_async(names, force)
+        if busy_wait:
+            errors = [future.exception() for future in futures.values()]
+            for error in errors:
+                if error is not None:
+                    raise error
+        return futures
@@ -1,12 +1,19 @@
 """PIL/Tkinter based simulator for InkyWHAT and InkyWHAT."""
+from concurrent.futures import Future
+
 import numpy
 
 from . import inky, inky_uc8159
+from .dither import dither_image
+from .loader import fit_image
 
 
 class InkyMock(inky.Inky):
     """Base simulator class for Inky."""
 
+    # Buffer kept by load_frame() for trigger_refresh()
+    _loaded_buf = None
+
     def __init__(self, colour, h_flip=False, v_flip=False, resolution=None):
         """Initialise an Inky pHAT Display.
 
@@ -126,13 +133,17 @@ class InkyMock(inky.Inky):
         self.cv.bind("<Configure>", self.resize)
         self.tk_root.update()
 
-    def show(self, busy_wait=True):
+    def show(self, busy_wait=True, force=False, **kwargs):
         """Show buffer on display.
 
         :param busy_wait: Ignored. Updates are simulated and instant.
+        :param force: Ignored. Every update is simulated.
+
+        Other keyword arguments accepted by the drivers, eg: `region`, are ignored.
 
         """
         print(">> Simulating {} {}x{}...".format(self.colour, self.width, self.height))
+        self.clear_dirty()
 
         region = self.buf
 
@@ -147,6 +158,47 @@ class InkyMock(inky.Inky):
 
         self._simulate(region)
 
+    def show_async(self, force=False, **kwargs):
+        """Show buffer on display.
+
+        Updates are simulated and instant, and Tk must be driven from the
+        calling thread, so this returns an already completed future.
+
+        :param force: Ignored. Every update is simulated.
+
+        """
+        future = Future()
+        self.show()
+        future.set_result(None)
+        return future
+
+    def load_frame(self, force=False, **kwargs):
+        """Keep a copy of the buffer for `trigger_refresh()`.
+
+        :param force: Ignored. Every update is simulated.
+
+        """
+        self._loaded_buf = self.buf.copy()
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def trigger_refresh(self, busy_wait=True):
+        """Simulate the buffer kept by `load_frame()`.
+
+        :param busy_wait: Ignored. Updates are simulated and instant.
+
+        """
+        if self._loaded_buf is not None:
+            buf, self.buf, self._loaded_buf = self.buf, self._loaded_buf, None
+            try:
+                self.show()
+            finally:
+                self.buf = buf
+        future = Future()
+        future.set_result(None)
+        return future
+
 
 class InkyMockPHAT(InkyMock):
     """Inky PHAT (212x104) e-Ink Display Simulator."""
@@ -236,6 +288,10 @@ class InkyMockImpression(InkyMock):
         [177, 106, 73],
         [255, 255, 255]]
 
+    # Colours accepted by set_pixel and the bulk drawing methods
+    _valid_colours = None
+    _colour_mask = 0x0F
+
     def __init__(self, resolution=None):
         """Initialize a new mock Inky Impression.
 
@@ -250,20 +306,29 @@ class InkyMockImpression(InkyMock):
     def set_pixel(self, x, y, v):
         """Set a single pixel on the display."""
         self.buf[y][x] = v & 0xF
+        self._mark_dirty(x, y)
 
-    def set_image(self, image, saturation=0.5):
+    def set_image(self, image, saturation=0.5, dither=None, fit=None, resample=None):
         """Copy an image to the display.
 
         :param image: PIL image to copy, must be 600x448
         :param saturation: Saturation for quantization palette - higher value results in a more saturated image
+        :param dither: Dither method from `inky.dither.METHODS`, eg: "bayer8" or "stucki", or None for PIL's Floyd-Steinberg
+        :param fit: Scale images that aren't the display size, "contain", "cover" or "stretch", see `inky.loader.fit_image()`
+        :param resample: PIL resampling filter used by `fit`, defaults to Lanczos
 
         """
+        if fit is not None:
+            image = fit_image(image, (self.width, self.height), fit, resample)
+
         if not image.size == (self.width, self.height):
             raise ValueError("Image must be ({}x{}) pixels!".format(self.width, self.height))
-        if not image.mode == "P":
+        if not image.mode == "P" and dither is not None:
+            image = dither_image(image, inky_uc8159.Inky._palette_blend(saturation), dither)
+        elif not image.mode == "P":
             if Image is None:
                 raise RuntimeError("PIL is required for converting images: sudo apt install python-pil python3-pil")
-            palette = inky_uc8159.Inky._palette_blend(self, saturation)
+            palette = inky_uc8159.Inky._palette_blend(saturation)
             # Image size doesn't matter since it's just the palette we're using
             palette_image = Image.new("P", (1, 1))
             # Set our 7 colour palette (+ clear) and zero out the other 247 colours
@@ -272,3 +337,4 @@ class InkyMockImpression(InkyMock):
             image.load()
             image = image.im.convert("P", True, palette_image.im)
         self.buf = numpy.array(image, dtype=numpy.uint8).reshape((self.rows, self.cols))
+        self._mark_dirty(0, 0, self.width, self.height)
@@ -0,0 +1,152 @@
+"""Palette helpers shared by the colour Inky drivers."""
+import functools
+import hashlib
+import os
+import tempfile
+
+import numpy
+from PIL import Image
+
+
+def blend_palette(saturated, desaturated, saturation, dtype="uint8"):
+    """Blend between a saturated and desaturated palette.
+
+    :param saturated: list of [r, g, b] colours
+    :param desaturated: list of [r, g, b] colours, the same length as `saturated`
+    :param saturation: amount of the saturated palette, from 0.0 to 1.0
+    :param dtype: "uint8" for a flat list of r, g, b values or "uint24" for one 0xRRGGBB value per colour
+
+    """
+    saturation = float(saturation)
+    colours = numpy.array(saturated, dtype=float) * saturation + numpy.array(desaturated, dtype=float) * (1.0 - saturation)
+    colours = colours.astype(int)
+
+    if dtype == "uint24":
+        return ((colours[:, 0] << 16) | (colours[:, 1] << 8) | colours[:, 2]).tolist()
+
+    return colours.flatten().tolist()
+
+
+@functools.lru_cache(maxsize=32)
+def get_palette_image(cls, saturation, pad=False):
+    """Return a palette image for quantizing images to a driver's colours.
+
+    Images are cached per driver class and saturation and must not be modified.
+
+    :param cls: driver class, providing `_palette_blend(saturation)`
+    :param saturation: saturation passed to `_palette_blend`
+    :param pad: zero out the unused palette entries, up to 256 colours
+
+    """
+    palette = cls._palette_blend(saturation)
+    if pad:
+        palette += [0, 0, 0] * (256 - len(palette) // 3)
+
+    # Image size doesn't matter since it's just the palette we're using
+    image = Image.new("P", (1, 1))
+    image.putpalette(palette)
+    return image
+
+
+METRICS = ("rgb", "redmean")
+
+
+def cache_dir():
+    """Return the directory used for Inky's on-disk caches."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "inky")
+
+
+def palette_lut(palette, bits=6, metric="rgb"):
+    """Return a lookup table from RGB to the index of the nearest palette colour.
+
+    The table has 2 ** (bits * 3) entries, indexed by the top `bits` bits of
+    red, green and blue. Tables are built once, then cached in memory and in
+    `cache_dir()`, so they're shared between runs.
+
+    :param palette: flat list of r, g, b values, eg: from a driver's `_palette_blend()`
+    :param bits: bits per channel, from 1 to 8
+    :param metric: colour distance, "rgb" for plain RGB distance or "redmean" for a perceptual weighting
+
+    """
+    if not 1 <= bits <= 8:
+        raise ValueError("LUT bits must be from 1 to 8!")
+    if metric not in METRICS:
+        raise ValueError("Unsupported colour metric: {}, must be one of {}".format(metric, ", ".join(METRICS)))
+    return _palette_lut(tuple(int(c) for c in palette), bits, metric)
+
+
+def quantize(pixels, palette, bits=6, metric="rgb"):
+    """Map RGB pixels to the index of the nearest palette colour, without dithering.
+
+    :param pixels: array of [r, g, b] pixels, values outside 0-255 are clipped
+    :param palette: flat list of r, g, b values, eg: from a driver's `_palette_blend()`
+    :param bits: bits per channel of the lookup table, see `palette_lut()`
+    :param metric: colour distance, see `palette_lut()`
+
+    """
+    lut = palette_lut(palette, bits, metric)
+
+    pixels = numpy.asarray(pixels)[..., :3]
+    if pixels.dtype != numpy.uint8:
+        pixels = numpy.clip(pixels, 0, 255).astype(numpy.uint8)
+
+    shift = 8 - bits
+    index = (pixels[..., 0] >> shift).astype(numpy.uint32) << (bits * 2)
+    index |= (pixels[..., 1] >> shift).astype(numpy.uint32) << bits
+    index |= pixels[..., 2] >> shift
+    return lut[index]
+
+
+@functools.lru_cache(maxsize=16)
+def _palette_lut(palette, bits, metric):
+    digest = hashlib.blake2b(repr((palette, bits, metric)).encode(), digest_size=8).hexdigest()
+    path = os.path.join(cache_dir(), "lut-{}.npy".format(digest))
+
+    try:
+        lut = numpy.load(path)
+        if lut.shape == (1 << (bits * 3),) and lut.dtype == numpy.uint8:
+            lut.flags.writeable = False
+            return lut
+    except (OSError, ValueError):
+        pass
+
+    lut = _build_lut(palette, bits, metric)
+
+    # The cache is just an optimisation, so carry on if it's not writable
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            numpy.save(f, lut)
+        # Readable by other users, eg: a LUT written by the daemon
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except OSError:
+        pass
+
+    lut.flags.writeable = False
+    return lut
+
+
+def _build_lut(palette, bits, metric):
+    """Find the nearest palette colour to the centre of every LUT cell."""
+    size = 1 << bits
+    levels = (numpy.arange(size, dtype=numpy.float32) + 0.5) * (256 / size) - 0.5
+    r, g, b = numpy.meshgrid(levels, levels, levels, indexing="ij")
+    r, g, b = r.ravel(), g.ravel(), b.ravel()
+
+    best = numpy.full(r.shape, numpy.inf, dtype=numpy.float32)
+    lut = numpy.zeros(r.shape, dtype=numpy.uint8)
+    for index, (pr, pg, pb) in enumerate(numpy.asarray(palette, dtype=numpy.float32).reshape((-1, 3))):
+        dr, dg, db = r - pr, g - pg, b - pb
+        if metric == "redmean":
+            mean = (r + pr) / 2
+            distance = (2 + mean / 256) * dr * dr + 4 * dg * dg + (2 + (255 - mean) / 256) * db * db
+        else:
+            distance = dr * dr + dg * dg + db * db
+        closer = distance < best
+        best[closer] = distance[closer]
+        lut[closer] = index
+
+    return lut
@@ -45,9 +45,7 @@ class InkyPHAT(inky.Inky):
         >>> from inky import InkyPHAT
         >>> display = InkyPHAT('red')
         >>> display.set_border(display.BLACK)
-        >>> for x in range(display.WIDTH):
-        >>>     for y in range(display.HEIGHT):
-        >>>         display.set_pixel(x, y, display.RED)
+        >>> display.fill_rect(0, 0, display.WIDTH, display.HEIGHT, display.RED)
         >>> display.show()
     """
 
@@ -0,0 +1,168 @@
+"""Framebuffer shared between processes.
+
+Lets renderer processes draw frames while a separate display process owns
+the driver and does the (slow) updates. The buffer lives in a memory-mapped
+file, by default in /dev/shm, so nothing is copied between processes.
+
+Writers take an exclusive lock on the file and bump a generation counter
+around every change, seqlock style: the counter is odd while a write is in
+progress. Readers never lock. They copy the buffer and retry if the counter
+moved while they were copying.
+
+Display process::
+
+    shared = SharedFramebuffer("/dev/shm/inky", display.buf.shape)
+    display.share_buffer(shared)
+
+    generation = None
+    while True:
+        generation = shared.wait(generation)
+        display.show()
+
+Renderer process::
+
+    shared = SharedFramebuffer("/dev/shm/inky")
+    with shared.writing() as buf:
+        buf[:] = frame
+
+Or attach a driver in the renderer too, and its drawing methods write to
+the shared buffer. `set_image()`, `set_buffer()`, `set_pixels()`,
+`fill_rect()` and `blit()` take the lock for you. `set_pixel()` does not,
+so draw pixel by pixel inside `writing()`::
+
+    with shared.writing():
+        for x, y in points:
+            display.set_pixel(x, y, display.BLACK)
+
+"""
+import fcntl
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+
+import numpy
+
+MAGIC = b"INKYSHM1"
+
+# magic, generation, rows, cols
+_HEADER = struct.Struct("<8sQII")
+_GENERATION = slice(8, 16)
+_DATA_OFFSET = 64
+
+
+class SharedFramebuffer:
+    """A uint8 framebuffer in a memory-mapped file, with a generation counter."""
+
+    def __init__(self, path, shape=None):
+        """Open a shared framebuffer, creating it if `shape` is given.
+
+        :param path: file to map, eg: "/dev/shm/inky"
+        :param shape: (rows, cols) of the buffer, eg: `display.buf.shape`.
+            If the file exists with a different shape it is recreated.
+
+        """
+        self.path = path
+        self._writing = False
+        self._fd = os.open(path, os.O_RDWR | (os.O_CREAT if shape is not None else 0), 0o666)
+
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                header = os.pread(self._fd, _HEADER.size, 0)
+                if len(header) == _HEADER.size and header[:8] == MAGIC:
+                    _, _, rows, cols = _HEADER.unpack(header)
+                    existing = (rows, cols)
+                else:
+                    existing = None
+
+                if shape is None and existing is None:
+                    raise ValueError("{} is not an Inky framebuffer!".format(path))
+
+                if shape is not None and tuple(shape) != existing:
+                    rows, cols = shape
+                    os.ftruncate(self._fd, _DATA_OFFSET + rows * cols)
+                    os.pwrite(self._fd, _HEADER.pack(MAGIC, 0, rows, cols), 0)
+                    existing = (rows, cols)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+            self.shape = existing
+            self._map = mmap.mmap(self._fd, _DATA_OFFSET + existing[0] * existing[1])
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+        self._generation = numpy.frombuffer(self._map, dtype="<u8", count=1, offset=_GENERATION.start)
+        self.buf = numpy.frombuffer(self._map, dtype=numpy.uint8, offset=_DATA_OFFSET).reshape(self.shape)
+
+    @property
+    def generation(self):
+        """Number of writes so far, doubled. Odd while a write is in progress."""
+        return int(self._generation[0])
+
+    @contextmanager
+    def writing(self):
+        """Lock the buffer for writing, returning it.
+
+        The generation is bumped before and after, so readers can tell a
+        frame has changed and never use a half-written one. Nested calls
+        share the outer lock.
+
+        """
+        if self._writing:
+            # Already locked further up, eg: set_image() inside a drawing block
+            yield self.buf
+            return
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._writing = True
+        try:
+            self._generation[0] += 1
+            try:
+                yield self.buf
+            finally:
+                self._generation[0] += 1
+        finally:
+            self._writing = False
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def snapshot(self):
+        """Return (generation, copy of the buffer), retrying if a write is in progress."""
+        while True:
+            generation = self.generation
+            if generation % 2 == 0:
+                frame = self.buf.copy()
+                if self.generation == generation:
+                    return generation, frame
+            time.sleep(0.001)
+
+    def wait(self, generation=None, timeout=None, interval=0.05):
+        """Wait for a complete frame newer than `generation`.
+
+        Returns the new generation, or None on timeout.
+
+        :param generation: last generation seen, or None to return the first complete frame
+        :param timeout: seconds to wait, or None to wait forever
+        :param interval: polling interval in seconds
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self.generation
+            if current % 2 == 0 and current != generation:
+                return current
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+
+    def close(self):
+        """Unmap the buffer and close the file."""
+        self.buf = self._generation = None
+        try:
+            self._map.close()
+        except BufferError:
+            # A driver still has a view of the buffer, the mapping goes when it does
+            pass
+        os.close(self._fd)
@@ -0,0 +1,64 @@
+"""SPI transport shared by the Inky drivers."""
+import threading
+
+import numpy
+
+_SPI_CHUNK_SIZE = 4096
+
+# Chip-select GPIO pins for each SPI bus, in channel order
+CS_PINS = {
+    0: (8, 7),
+    1: (18, 17, 16)
+}
+
+_bus_locks = {}
+_bus_locks_lock = threading.Lock()
+
+
+def bus_lock(spi_port):
+    """Return the lock for an SPI bus, held by a display while it updates.
+
+    Displays on different chip-selects of the same bus share one lock, so
+    their transfers never overlap. A display lets go of the lock while it
+    waits for BUSY, so others can send their frames during its refresh.
+
+    :param spi_port: SPI bus number
+
+    """
+    with _bus_locks_lock:
+        return _bus_locks.setdefault(spi_port, threading.Lock())
+
+
+def write(spi_bus, values, chunk_size=_SPI_CHUNK_SIZE):
+    """Write values to an SPI device.
+
+    Buffers (numpy arrays, bytes, bytearrays and memoryviews) are streamed
+    straight from their memory with `writebytes2`, which avoids building a
+    Python list of ints for every frame. Lists are sent with `xfer3` as before.
+
+    :param spi_bus: :class:`spidev.SpiDev` compatible device
+    :param values: int, list of ints or any object supporting the buffer protocol
+    :param chunk_size: transfer size used for spidev versions without `xfer3`/`writebytes2`
+
+    """
+    if isinstance(values, int):
+        values = [values]
+
+    if isinstance(values, (list, tuple)):
+        try:
+            spi_bus.xfer3(values)
+        except AttributeError:
+            for offset in range(0, len(values), chunk_size):
+                spi_bus.xfer(values[offset:offset + chunk_size])
+        return
+
+    if isinstance(values, numpy.ndarray):
+        values = numpy.ascontiguousarray(values, dtype=numpy.uint8)
+
+    data = memoryview(values).cast("B")
+
+    try:
+        spi_bus.writebytes2(data)
+    except AttributeError:
+        for offset in range(0, len(data), chunk_size):
+            spi_bus.writebytes(data[offset:offset + chunk_size].tolist())
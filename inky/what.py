@@ -17,9 +17,7 @@ class InkyWHAT(inky.Inky):
         >>> from inky import InkyWHAT
         >>> display = InkyWHAT('red')
         >>> display.set_border(display.BLACK)
-        >>> for x in range(display.WIDTH):
-        >>>     for y in range(display.HEIGHT):
-        >>>         display.set_pixel(x, y, display.RED)
+        >>> display.fill_rect(0, 0, display.WIDTH, display.HEIGHT, display.RED)
         >>> display.show()
     """
 
@@ -19,6 +19,12 @@ def cleanup():
             del sys.modules[module]
 
 
+@pytest.fixture(scope='function', autouse=True)
+def cache_home(monkeypatch, tmp_path):
+    """Keep on-disk caches, eg: palette LUTs, out of the real ~/.cache."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
 @pytest.fixture(scope='function', autouse=False)
 def nopath():
     old_path = sys.path
@@ -0,0 +1,100 @@
+"""BUSY line handling tests for Inky."""
+from unittest import mock
+
+import pytest
+
+
+class MockEdgeGPIO:
+    """Minimal gpiod line request producing queued edge events."""
+
+    def __init__(self, values, events):
+        self.values = list(values)
+        self.events = list(events)
+        self.set_values = []
+
+    def set_value(self, pin, value):
+        self.set_values.append((pin, value))
+
+    def get_value(self, pin):
+        return self.values.pop(0) if len(self.values) > 1 else self.values[0]
+
+    def wait_edge_events(self, timeout):
+        return bool(self.events)
+
+    def read_edge_events(self):
+        return self.events.pop(0) if self.events else []
+
+
+def test_busy_wait_release_edge(GPIO):
+    """Test that a wait returns on the release edge, not the timeout."""
+    gpiod, _ = GPIO
+    from inky import busy
+
+    busy_wait = busy.BusyWait(idle_grace=0.1)
+    gpio = MockEdgeGPIO([gpiod.Value.INACTIVE], [[mock.Mock(event_type=gpiod.EdgeEvent.Type.RISING_EDGE)]])
+
+    with mock.patch("time.sleep") as sleep:
+        duration = busy_wait.wait(gpio, 17, 40.0)
+
+    sleep.assert_not_called()
+    assert duration < 40.0
+    assert busy_wait.last_duration == duration
+
+
+def test_busy_wait_held_idle(GPIO):
+    """Test that an idle line which never asserts BUSY sleeps out the timeout."""
+    gpiod, _ = GPIO
+    from inky import busy
+
+    busy_wait = busy.BusyWait(idle_grace=0.1)
+    gpio = MockEdgeGPIO([gpiod.Value.ACTIVE], [])
+
+    with mock.patch("time.sleep") as sleep, pytest.warns(UserWarning, match="Held high"):
+        busy_wait.wait(gpio, 17, 0.5)
+
+    sleep.assert_called_once()
+
+
+def test_busy_wait_timeout_raises(GPIO):
+    """Test that active-high drivers raise on timeout."""
+    gpiod, _ = GPIO
+    from inky import busy
+
+    busy_wait = busy.BusyWait(busy_value=gpiod.Value.ACTIVE, raise_on_timeout=True)
+    gpio = MockEdgeGPIO([gpiod.Value.ACTIVE], [])
+
+    with pytest.raises(RuntimeError):
+        busy_wait.wait(gpio, 17, 0.01)
+
+
+def test_busy_reset_release_edge(GPIO):
+    """Test that a reset returns on the BUSY release edge, not the fallback delay."""
+    gpiod, _ = GPIO
+    from inky import busy
+
+    busy_wait = busy.BusyWait(idle_grace=0.1)
+    stale = [mock.Mock(event_type=gpiod.EdgeEvent.Type.FALLING_EDGE)]
+    release = [mock.Mock(event_type=gpiod.EdgeEvent.Type.RISING_EDGE)]
+    gpio = MockEdgeGPIO([gpiod.Value.INACTIVE], [stale, release])
+
+    with mock.patch("time.sleep") as sleep:
+        duration = busy_wait.reset(gpio, 27, 17, 0.01, 1.0)
+
+    sleep.assert_called_once_with(0.01)
+    assert gpio.set_values == [(27, gpiod.Value.INACTIVE), (27, gpiod.Value.ACTIVE)]
+    assert duration < 1.0
+
+
+def test_busy_reset_no_busy(GPIO):
+    """Test that a reset never signalled on BUSY sleeps out the fallback delay."""
+    gpiod, _ = GPIO
+    from inky import busy
+
+    busy_wait = busy.BusyWait(busy_value=gpiod.Value.ACTIVE, raise_on_timeout=True)
+    gpio = MockEdgeGPIO([gpiod.Value.INACTIVE], [])
+
+    with mock.patch("time.sleep") as sleep:
+        busy_wait.reset(gpio, 27, 17, 0.01, 0.5)
+
+    assert sleep.call_count == 2
+    assert sleep.call_args_list[0] == mock.call(0.01)
@@ -0,0 +1,139 @@
+"""Display daemon tests for Inky."""
+import asyncio
+import threading
+import time
+
+
+def test_daemon_coalesces(GPIO, spidev, smbus2, tmp_path):
+    """Test that frames queued during a refresh are dropped for the newest."""
+    from unittest import mock
+
+    from inky import inky_jd79668
+    from inky.daemon import InkyClient, InkyDaemon
+
+    inky = inky_jd79668.Inky()
+    refreshing = threading.Event()
+    release = threading.Event()
+
+    def update(*frame):
+        refreshing.set()
+        release.wait(5)
+
+    inky._update = mock.MagicMock(side_effect=update)
+    daemon = InkyDaemon(inky, str(tmp_path / "inky.sock"))
+    replies = {}
+
+    async def run():
+        await daemon.start()
+        loop = asyncio.get_running_loop()
+
+        frames = [bytes([colour]) * inky.buf.size for colour in (inky.RED, inky.YELLOW, inky.BLACK)]
+        ids = [daemon.submit("buffer", frames[0], replies.setdefault(0, []).append)]
+        await loop.run_in_executor(None, refreshing.wait, 5)
+
+        # Both arrive mid-refresh, only the last is shown
+        for n in (1, 2):
+            ids.append(daemon.submit("buffer", frames[n], replies.setdefault(n, []).append))
+        assert daemon.status()["busy"] and daemon.status()["pending"]
+        release.set()
+
+        client = InkyClient(daemon.path, timeout=5)
+        while daemon.shown < 2:
+            await asyncio.sleep(0.01)
+        status = await loop.run_in_executor(None, client.status)
+        client.close()
+        await daemon.close()
+        return ids, status
+
+    ids, status = asyncio.run(run())
+
+    assert [reply["status"] for reply in replies[0]] == ["queued", "refreshing", "shown"]
+    assert [reply["status"] for reply in replies[1]] == ["queued", "superseded"]
+    assert [reply["status"] for reply in replies[2]] == ["queued", "refreshing", "shown"]
+    assert replies[2][-1]["id"] == ids[2]
+
+    assert inky._update.call_count == 2
+    assert (inky.buf == inky.BLACK).all()
+    assert status["shown"] == 2 and status["superseded"] == 1 and not status["busy"]
+
+
+def test_client_matches_replies(GPIO, spidev, smbus2, tmp_path):
+    """Test that a client keeps events for earlier frames out of the replies to later requests."""
+    from unittest import mock
+
+    from inky import inky_jd79668
+    from inky.daemon import InkyClient, InkyDaemon
+
+    inky = inky_jd79668.Inky()
+    inky._update = mock.MagicMock()
+    daemon = InkyDaemon(inky, str(tmp_path / "inky.sock"))
+
+    def requests(client):
+        first = client.show_buffer(inky.buf * 0 + inky.RED, wait=False)
+        while daemon.shown < 1:
+            time.sleep(0.01)
+        status = client.status()
+        second = client.show_buffer(inky.buf * 0 + inky.BLACK)
+        return first, status, second, client.wait(first["id"])
+
+    async def run():
+        await daemon.start()
+        client = InkyClient(daemon.path, timeout=5)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, requests, client)
+        finally:
+            client.close()
+            await daemon.close()
+
+    first, status, second, first_final = asyncio.run(run())
+
+    assert first["status"] == "queued"
+    assert status["status"] == "ok"
+    assert second["status"] == "shown" and second["id"] != first["id"]
+    assert first_final == {"id": first["id"], "status": "shown", "duration": first_final["duration"]}
+
+
+def test_main_rejects_unknown_flags():
+    """Test that a mistyped flag is an error rather than ignored."""
+    import pytest
+
+    from inky.daemon import main
+
+    with pytest.raises(SystemExit):
+        main(["--sockett", "/tmp/inky.sock"])
+
+
+def test_daemon_rejects_bad_requests(GPIO, spidev, smbus2, tmp_path):
+    """Test that malformed requests get an error reply and leave the connection open."""
+    import json
+    import socket
+    from unittest import mock
+
+    from inky import inky_jd79668
+    from inky.daemon import InkyDaemon
+
+    inky = inky_jd79668.Inky()
+    inky.show_image = mock.MagicMock()
+    daemon = InkyDaemon(inky, str(tmp_path / "inky.sock"))
+
+    def requests():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(daemon.path)
+            replies = sock.makefile("rb")
+            sock.sendall(b"[]\n1\n")
+            sock.sendall(b'{"op": "image", "size": 1, "options": {"busy_wait": false}}\nx')
+            sock.sendall(b'{"op": "status"}\n')
+            return [json.loads(replies.readline()) for _ in range(4)]
+
+    async def run():
+        await daemon.start()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, requests)
+        finally:
+            await daemon.close()
+
+    replies = asyncio.run(run())
+
+    assert [reply["status"] for reply in replies] == ["error", "error", "error", "ok"]
+    inky.show_image.assert_not_called()
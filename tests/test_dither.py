@@ -0,0 +1,58 @@
+"""Ordered dithering tests for Inky."""
+import numpy
+import pytest
+
+
+def test_bayer_matrix():
+    """Test that Bayer matrices use every threshold once."""
+    from inky.dither import bayer_matrix
+
+    matrix = bayer_matrix(8)
+    assert matrix.shape == (8, 8)
+    assert sorted((matrix * 64 - 0.5).flatten().tolist()) == list(range(64))
+
+    with pytest.raises(ValueError):
+        bayer_matrix(6)
+
+
+def test_blue_noise():
+    """Test that the blue-noise tile has an even spread of thresholds and little low frequency energy."""
+    from inky.dither import blue_noise
+
+    tile = blue_noise()
+    assert len(numpy.unique(tile)) == tile.size
+
+    spectrum = numpy.abs(numpy.fft.fft2(tile - 0.5)) ** 2
+    assert spectrum[:4, :4].mean() < spectrum[28:36, 28:36].mean() / 100
+
+
+@pytest.mark.parametrize('method', ["bayer8", "bluenoise", "floyd-steinberg", "jarvis"])
+def test_dither_tone(method):
+    """Test that dithering a grey ramp to black and white keeps its tone."""
+    from inky.dither import dither_image
+
+    ramp = numpy.tile(numpy.linspace(0, 255, 640)[None, :, None], (64, 1, 3))
+    result = dither_image(ramp, [0, 0, 0, 255, 255, 255], method)
+
+    tone = result.reshape(64, 10, 64).mean(axis=(0, 2))
+    assert numpy.allclose(tone, numpy.linspace(0.05, 0.95, 10), atol=0.02)
+
+
+def test_dither_unknown_method():
+    """Test that an unknown dither method is rejected."""
+    from inky.dither import dither_image
+
+    with pytest.raises(ValueError):
+        dither_image(numpy.zeros((8, 8, 3)), [0, 0, 0, 255, 255, 255], "floyd")
+
+
+def test_diffuse_serpentine():
+    """Test that serpentine scanning mirrors the kernel on alternate rows."""
+    from inky.dither import diffuse
+
+    grey = numpy.full((4, 16, 3), 100.0)
+    forward = diffuse(grey, [0, 0, 0, 255, 255, 255], "floyd-steinberg", serpentine=False)
+    serpentine = diffuse(grey, [0, 0, 0, 255, 255, 255], "floyd-steinberg")
+
+    assert (forward[0] == serpentine[0]).all()
+    assert (forward[1] != serpentine[1]).any()
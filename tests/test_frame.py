@@ -0,0 +1,102 @@
+"""Frame file and frame cache tests for Inky."""
+import os
+from unittest import mock
+
+import numpy
+import pytest
+
+
+def test_frame_roundtrip(tmp_path):
+    """Test that packed planes survive a trip through a frame file."""
+    from inky import frame
+
+    planes = (numpy.arange(100, dtype=numpy.uint8), numpy.full(3, 0xAA, dtype=numpy.uint8))
+    frame.write_frame(tmp_path / "test.frame", planes, driver="inky.inky_e673", resolution=[800, 480])
+
+    loaded, header = frame.read_frame(tmp_path / "test.frame")
+    assert header["driver"] == "inky.inky_e673"
+    assert [plane.tolist() for plane in loaded] == [plane.tolist() for plane in planes]
+
+    # Planes are copy-on-write
+    loaded[0][0] = 99
+    assert frame.read_frame(tmp_path / "test.frame")[0][0][0] == 0
+
+
+def test_frame_cache_replay(GPIO, spidev, smbus2, tmp_path):
+    """Test that a cached image goes straight to the display without converting it again."""
+    from PIL import Image
+
+    from inky import inky_jd79668
+    from inky.cache import FrameCache
+
+    cache = FrameCache(tmp_path)
+    image = tmp_path / "image.png"
+    Image.new("RGB", (400, 300), (255, 0, 0)).save(image)
+
+    inky = inky_jd79668.Inky()
+    inky._update = mock.MagicMock()
+
+    inky.show_image(image, cache=cache)
+    (packed,) = inky._update.call_args[0]
+
+    inky.set_image = mock.MagicMock()
+    inky.show_image(image, cache=cache)
+    inky.set_image.assert_not_called()
+    assert cache.hits == 1
+
+    (replayed,) = inky._update.call_args[0]
+    assert isinstance(replayed, numpy.memmap)
+    assert (replayed == packed).all()
+
+    # A different setting is a different frame
+    inky.show_image(image, cache=cache, saturation=1.0)
+    assert inky.set_image.call_count == 1
+
+
+def test_frame_cache_evicts_oldest(tmp_path):
+    """Test that the cache is trimmed to size, oldest frames first."""
+    from inky.cache import FrameCache
+
+    cache = FrameCache(tmp_path, max_bytes=3000)
+    for n, key in enumerate("abcd"):
+        cache.put(key, [numpy.zeros(900, dtype=numpy.uint8)])
+        os.utime(cache._path(key), (n, n))
+
+    cache.put("e", [numpy.zeros(900, dtype=numpy.uint8)])
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("e") is not None
+
+
+def test_frame_cache_truncated(tmp_path):
+    """Test that a truncated frame file is a cache miss."""
+    from inky.cache import FrameCache
+
+    cache = FrameCache(tmp_path)
+    cache.put("a", [numpy.zeros(900, dtype=numpy.uint8)])
+    for size in (4, 20, 100):
+        os.truncate(cache._path("a"), size)
+        assert cache.get("a") is None
+    assert cache.misses == 3
+
+def test_compile_show_frame(GPIO, spidev, smbus2, tmp_path):
+    """Test that compiled frames match set_image and can be shown without converting them."""
+    from PIL import Image
+
+    from inky import compile, inky_e673
+
+    Image.new("RGB", (1600, 960), (0, 0, 255)).save(tmp_path / "blue.png")
+
+    assert compile.main([str(tmp_path), str(tmp_path / "frames"), "--driver", "e673", "--jobs", "1"]) == 0
+
+    inky = inky_e673.Inky()
+    inky._update = mock.MagicMock()
+    inky.show_frame(tmp_path / "frames" / "blue.frame")
+
+    (sent,) = inky._update.call_args[0]
+    assert (sent == (inky_e673.BLUE << 4 | inky_e673.BLUE)).all()
+
+    inky_small = inky_e673.Inky()
+    inky_small.resolution = (400, 300)
+    with pytest.raises(ValueError):
+        inky_small.show_frame(tmp_path / "frames" / "blue.frame")
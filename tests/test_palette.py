@@ -0,0 +1,43 @@
+"""Palette handling tests for Inky."""
+
+
+def test_palette_blend(GPIO, spidev, smbus2):
+    """Test the vectorised blend against a hand-blended colour."""
+    from inky import inky_e673
+
+    palette = inky_e673.Inky._palette_blend(0.25)
+    assert len(palette) == 6 * 3
+
+    r, g, b = [int(s * 0.25 + d * 0.75) for s, d in zip(inky_e673.Inky.SATURATED_PALETTE[3], inky_e673.Inky.DESATURATED_PALETTE[3])]
+    assert palette[9:12] == [r, g, b]
+    assert inky_e673.Inky._palette_blend(0.25, "uint24")[3] == (r << 16) | (g << 8) | b
+
+
+def test_palette_image_cached(GPIO, spidev, smbus2):
+    """Test that palette images are reused for the same driver and saturation."""
+    from inky import inky_uc8159
+    from inky.palette import get_palette_image
+
+    image = get_palette_image(inky_uc8159.Inky, 0.5, pad=True)
+    assert get_palette_image(inky_uc8159.Inky, 0.5, pad=True) is image
+    assert get_palette_image(inky_uc8159.Inky, 0.6, pad=True) is not image
+
+
+def test_palette_lut(tmp_path, monkeypatch):
+    """Test that the colour lookup table finds the nearest colour and is cached on disk."""
+    import numpy
+
+    from inky import palette
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    colours = [0, 0, 0, 255, 255, 255, 255, 0, 0, 0, 0, 255]
+
+    pixels = numpy.array([[[0, 0, 0], [250, 250, 250], [200, 40, 30], [20, 10, 180]]], dtype=numpy.uint8)
+    assert palette.quantize(pixels, colours, bits=5).tolist() == [[0, 1, 2, 3]]
+    (cached,) = (tmp_path / "inky").iterdir()
+    assert cached.stat().st_mode & 0o777 == 0o644
+
+    palette._palette_lut.cache_clear()
+    lut = palette.palette_lut(colours, bits=5)
+    assert lut.shape == (32 ** 3,)
+    assert not lut.flags.writeable
@@ -26,3 +26,77 @@ def test_inky_set_image(GPIO, spidev, smbus2, resolution):
     data[0] = 2
 
     assert phat.buf.flatten().tolist()[0:width] == data
+
+
+def test_inky_set_image_ordered_dither(GPIO, spidev, smbus2):
+    """Test that ordered dithering maps to the display's native colours."""
+    from PIL import Image
+
+    from inky import inky_e673
+
+    inky = inky_e673.Inky()
+
+    image = Image.new("RGB", inky.resolution, (255, 255, 255))
+    image.paste((0, 0, 255), (0, 0, 100, 100))
+
+    inky.set_image(image, dither="bayer4")
+
+    assert inky.buf[0, 0] == inky_e673.BLUE
+    assert inky.buf[-1, -1] == inky_e673.WHITE
+    assert inky.dirty_region() == (0, 0, inky.width, inky.height)
+
+
+def test_inky_set_image_bands(GPIO, spidev, smbus2):
+    """Test that converting in parallel bands matches converting in one piece."""
+    import numpy
+    from PIL import Image
+
+    from inky import bands, inky_el133uf1
+
+    assert bands.band_rows(1200, 4, 16) == [(0, 0, 320), (304, 320, 640), (624, 640, 960), (944, 960, 1200)]
+
+    inky = inky_el133uf1.Inky()
+    image = Image.fromarray(numpy.random.default_rng(0).integers(0, 256, (inky.height, inky.width, 3), dtype=numpy.uint8))
+
+    inky.set_image(image, dither="bluenoise", bands=1)
+    single = inky.buf.copy()
+
+    inky.set_image(image, dither="bluenoise", bands=4)
+    assert (inky.buf == single).all()
+
+
+def test_load_image_draft(tmp_path):
+    """Test that large JPEGs are decoded at a reduced scale before resizing."""
+    from PIL import Image
+
+    from inky import loader
+
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (4000, 3000), (255, 0, 0)).save(path)
+
+    image = Image.open(path)
+    loader.draft(image, (800, 480))
+    assert image.size == (1000, 750)
+
+    image = loader.load_image(path, (800, 480))
+    assert image.size == (800, 480)
+    assert image.getpixel((0, 0))[0] > 250
+
+
+@pytest.mark.parametrize('fit', ["contain", "cover", "stretch"])
+def test_inky_set_image_fit(GPIO, spidev, smbus2, fit):
+    """Test that images are scaled to the display size with a single resample."""
+    from PIL import Image
+
+    from inky import inky_jd79668
+
+    inky = inky_jd79668.Inky()
+
+    with pytest.raises(ValueError):
+        inky.set_image(Image.new("RGB", (800, 300)))
+
+    inky.set_image(Image.new("RGB", (800, 300), (255, 0, 0)), fit=fit)
+
+    # Contained images are padded with white above and below
+    assert inky.buf[0, 0] == (inky_jd79668.WHITE if fit == "contain" else inky_jd79668.RED)
+    assert inky.buf[150, 200] == inky_jd79668.RED
@@ -0,0 +1,65 @@
+"""Shared framebuffer tests for Inky."""
+import multiprocessing
+
+
+def _render(path, colour):
+    from inky.shared import SharedFramebuffer
+
+    shared = SharedFramebuffer(path)
+    with shared.writing() as buf:
+        buf[:] = colour
+    shared.close()
+
+
+def test_shared_framebuffer(GPIO, spidev, smbus2, tmp_path):
+    """Test that a frame drawn in another process is picked up and shown."""
+    from unittest import mock
+
+    from inky import inky_jd79668
+    from inky.shared import SharedFramebuffer
+
+    inky = inky_jd79668.Inky()
+    inky._update = mock.MagicMock()
+
+    shared = SharedFramebuffer(str(tmp_path / "fb"), inky.buf.shape)
+    inky.share_buffer(shared)
+    assert shared.wait(None, timeout=0) == 0
+
+    process = multiprocessing.get_context("fork").Process(target=_render, args=(str(tmp_path / "fb"), inky.RED))
+    process.start()
+    process.join()
+
+    assert shared.wait(0, timeout=1) == 2
+    assert (inky.buf == inky.RED).all()
+
+    inky.show()
+    assert inky.shown_generation == 2
+    (packed,) = inky._update.call_args[0]
+    assert (packed == 0b01010101 * inky.RED).all()
+
+    # Replacing the buffer writes through to shared memory
+    inky.set_buffer(inky.buf * 0)
+    assert shared.generation == 4
+    assert shared.buf.sum() == 0
+
+    # Drawing in place takes the write lock too
+    inky.fill_rect(0, 0, 10, 10, inky.RED)
+    assert shared.generation == 6
+    assert (shared.buf[:10, :10] == inky.RED).all()
+
+
+def test_shared_set_image_bands(GPIO, spidev, smbus2, tmp_path):
+    """Test that a banded set_image() publishes a new frame to the shared buffer."""
+    from PIL import Image
+
+    from inky import inky_el133uf1
+    from inky.shared import SharedFramebuffer
+
+    inky = inky_el133uf1.Inky()
+    shared = SharedFramebuffer(str(tmp_path / "fb"), inky.buf.shape)
+    inky.share_buffer(shared)
+
+    inky.set_image(Image.new("RGB", (inky.width, inky.height), (255, 0, 0)), dither="bayer8", bands=2)
+    assert shared.generation == 2
+    assert shared.wait(0, timeout=0) == 2
+    assert (shared.buf == inky.buf).all()
@@ -0,0 +1,314 @@
+"""Display update tests for Inky."""
+import threading
+from unittest import mock
+
+import pytest
+
+
+def test_show_async_packs_immediately(GPIO, spidev, smbus2):
+    """Test that show_async snapshots the buffer before returning."""
+    from inky import inky_e673
+
+    inky = inky_e673.Inky()
+    inky._update = mock.MagicMock()
+
+    future = inky.show_async()
+    inky.buf[:] = 1
+    future.result(timeout=5)
+
+    buf, = inky._update.call_args[0]
+    assert len(buf) == 800 * 480 // 2
+    assert not buf.any()
+
+
+def test_show_no_busy_wait_returns_early(GPIO, spidev, smbus2):
+    """Test that show(busy_wait=False) leaves the refresh running in the background."""
+    from inky import inky_jd79661
+
+    inky = inky_jd79661.Inky()
+    release = threading.Event()
+    inky._update = mock.MagicMock(side_effect=lambda buf: release.wait(5))
+
+    inky.show(busy_wait=False)
+    assert not release.is_set()
+
+    release.set()
+    inky.show_async(force=True).result(timeout=5)
+    assert inky._update.call_count == 2
+
+
+def test_show_skips_unchanged_frame(GPIO, spidev, smbus2):
+    """Test that an unchanged frame is not sent to the display again."""
+    from inky import inky_uc8159
+
+    inky = inky_uc8159.Inky()
+    inky._update = mock.MagicMock()
+
+    inky.show()
+    inky.show()
+    assert inky._update.call_count == 1
+    assert inky.skipped_refreshes == 1
+
+    inky.set_border(inky.RED)
+    inky.show()
+    inky.show(force=True)
+    assert inky._update.call_count == 3
+
+
+def test_async_show_waits_on_loop(GPIO, spidev, smbus2):
+    """Test that AsyncInky parks BUSY waits on the event loop."""
+    import asyncio
+    import os
+
+    from inky import inky_e673
+    from inky.aio import AsyncInky
+
+    gpiod, _ = GPIO
+    read_fd, write_fd = os.pipe()
+
+    inky = inky_e673.Inky()
+    inky._gpio = mock.MagicMock(fd=read_fd)
+    inky._gpio.get_value.return_value = gpiod.Value.INACTIVE
+    inky._gpio.read_edge_events.return_value = []
+    inky._update = lambda buf: inky._busy_wait(5.0)
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.05, os.write, write_fd, b"\x00")
+        await AsyncInky(inky).show()
+
+    asyncio.run(main())
+
+    inky._gpio.wait_edge_events.assert_not_called()
+
+    # Only that update waited on the loop
+    inky.show_async(force=True).result(timeout=5)
+    inky._gpio.wait_edge_events.assert_called()
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_show_region_ssd1683(GPIO, spidev, smbus2):
+    """Test that a partial update only sends the RAM window covering the region."""
+    from inky import inky_ssd1683, ssd1683
+
+    inky = inky_ssd1683.Inky()
+    inky.setup = mock.MagicMock()
+    inky._busy_wait = mock.MagicMock()
+    inky._send_command = mock.MagicMock()
+
+    inky.show()
+    inky._send_command.reset_mock()
+
+    inky.set_pixel(12, 10, inky.BLACK)
+    inky.show(region=(10, 10, 10, 4))
+
+    commands = {c[0][0]: c[0][1] if len(c[0]) > 1 else None for c in inky._send_command.call_args_list}
+    assert commands[ssd1683.SET_RAMXPOS] == [1, 2]
+    assert commands[ssd1683.SET_RAMYPOS] == [10, 0, 13, 0]
+    assert len(commands[ssd1683.WRITE_RAM]) == 2 * 4
+    assert inky._shown[10, 1] == 0b11110111
+    inky.setup.assert_called_once()
+
+
+def test_show_dirty_region_ssd1683(GPIO, spidev, smbus2):
+    """Test that drawing is tracked and can drive a partial update."""
+    from inky import inky_ssd1683, ssd1683
+
+    inky = inky_ssd1683.Inky()
+    inky.setup = mock.MagicMock()
+    inky._busy_wait = mock.MagicMock()
+    inky._send_command = mock.MagicMock()
+
+    inky.show()
+    assert inky.dirty_region() is None
+
+    inky.set_pixel(12, 10, inky.BLACK)
+    inky.set_pixel(30, 20, inky.BLACK)
+    assert inky.dirty_region() == (12, 10, 19, 11)
+
+    inky._send_command.reset_mock()
+    inky.show(region="dirty")
+
+    commands = {c[0][0]: c[0][1] if len(c[0]) > 1 else None for c in inky._send_command.call_args_list}
+    assert commands[ssd1683.SET_RAMXPOS] == [1, 3]
+    assert commands[ssd1683.SET_RAMYPOS] == [10, 0, 20, 0]
+    assert inky.dirty_region() is None
+
+    inky.show(region="dirty")
+    assert inky.skipped_refreshes == 1
+
+
+def test_session_partial_then_full_ssd1683(GPIO, spidev, smbus2):
+    """Test that partial and full updates in a session leave the refresh mode alone."""
+    from inky import inky_ssd1683, ssd1683
+
+    inky = inky_ssd1683.Inky(gpio=mock.MagicMock(), spi_bus=mock.MagicMock())
+    inky._busy = mock.MagicMock()
+    inky._send_command = mock.MagicMock(wraps=inky._send_command)
+
+    with inky.session():
+        inky.show()
+        inky.set_pixel(12, 10, inky.BLACK)
+        inky.show(region=(10, 10, 10, 4))
+        inky.show(force=True)
+
+    commands = [c[0][0] for c in inky._send_command.call_args_list]
+    assert ssd1683.DISP_CTRL2 not in commands
+    assert commands.count(ssd1683.MASTER_ACTIVATE) == 3
+
+
+def test_bulk_drawing(GPIO, spidev, smbus2):
+    """Test the bulk drawing methods match set_pixel's clipping and colour handling."""
+    import numpy
+
+    from inky import inky_jd79668
+
+    inky = inky_jd79668.Inky()
+
+    inky.fill_rect(-5, -5, 10, 10, inky.RED)
+    assert (inky.buf[:5, :5] == inky.RED).all()
+    assert inky.buf[5:, 5:].sum() == 0
+    assert inky.dirty_region() == (0, 0, 5, 5)
+
+    inky.set_pixels([0, 1, 2, 1000], [10, 10, 10, 10], [inky.YELLOW, 9, inky.YELLOW, inky.YELLOW])
+    assert inky.buf[10, :3].tolist() == [inky.YELLOW, 0, inky.YELLOW]
+
+    inky.blit(numpy.full((4, 4), inky.RED), inky.width - 2, inky.height - 2)
+    assert (inky.buf[-2:, -2:] == inky.RED).all()
+
+    with pytest.raises(ValueError):
+        inky.set_buffer(numpy.zeros((2, 2)))
+
+    inky.set_buffer(numpy.full(inky.buf.shape, inky.YELLOW))
+    assert (inky.buf == inky.YELLOW).all()
+
+
+def test_manager_buses(GPIO, spidev, smbus2):
+    """Test that displays on separate buses update together, and on a shared bus take turns."""
+    import time
+
+    from inky import inky_jd79661
+    from inky.manager import DisplayManager
+
+    manager = DisplayManager()
+    for name, spi_port, cs_pin in (("a", 0, 8), ("b", 0, 7), ("c", 1, 17)):
+        display = manager.add(name, inky_jd79661.Inky, spi_port=spi_port, cs_pin=cs_pin)
+        assert display.cs_channel == (0 if cs_pin == 8 else 1)
+
+    active = {0: 0, 1: 0}
+    overlap = []
+
+    def update(spi_port, buf):
+        active[spi_port] += 1
+        overlap.append(dict(active))
+        time.sleep(0.1)
+        active[spi_port] -= 1
+
+    for display in manager.displays.values():
+        display._update = mock.MagicMock(side_effect=lambda buf, spi_port=display.spi_port: update(spi_port, buf))
+
+    manager.show()
+
+    assert all(display._update.call_count == 1 for display in manager.displays.values())
+    assert max(counts[0] for counts in overlap) == 1
+    assert any(counts[0] and counts[1] for counts in overlap)
+
+
+def test_manager_shared_bus_overlaps_refresh(GPIO, spidev, smbus2):
+    """Test that a display refreshing lets the next display on its bus send its frame."""
+    import time
+
+    from inky import inky_jd79661
+    from inky.manager import DisplayManager
+
+    manager = DisplayManager()
+    sending = []
+    log = []
+
+    def update(display, buf):
+        for step in ("transfer", "refresh"):
+            sending.append(display)
+            assert len(sending) == 1
+            time.sleep(0.05)
+            sending.remove(display)
+            log.append(step)
+            display._busy_wait()
+
+    for name, cs_pin in (("a", 8), ("b", 7)):
+        display = manager.add(name, inky_jd79661.Inky, cs_pin=cs_pin)
+        display._busy = mock.MagicMock(wait=mock.MagicMock(side_effect=lambda *args: time.sleep(0.3)))
+        display._update = mock.MagicMock(side_effect=lambda buf, display=display: update(display, buf))
+
+    t_start = time.monotonic()
+    manager.show()
+    elapsed = time.monotonic() - t_start
+
+    # Serialised, the two updates would take 1.4s
+    assert log[:2] == ["transfer", "transfer"]
+    assert elapsed < 1.2
+
+
+def test_load_frame_then_refresh(GPIO, spidev, smbus2):
+    """Test that load_frame() sends the frame and trigger_refresh() only starts the refresh."""
+    from inky import inky_e673
+
+    inky = inky_e673.Inky()
+    inky.setup = mock.MagicMock()
+    inky._send_command = mock.MagicMock()
+    inky._busy_wait = mock.MagicMock()
+
+    inky.buf[:] = inky.RED
+    inky.load_frame().result(timeout=5)
+    commands = [call[0][0] for call in inky._send_command.call_args_list]
+    assert commands == [inky_e673.EL673_DTM1]
+    assert inky.setup.call_count == 1
+
+    inky._send_command.reset_mock()
+    inky.trigger_refresh()
+    commands = [call[0][0] for call in inky._send_command.call_args_list]
+    assert inky_e673.EL673_DTM1 not in commands
+    assert inky_e673.EL673_DRF in commands
+    assert inky.setup.call_count == 1
+
+    # Nothing left to refresh, and the frame is now known to be shown
+    inky._send_command.reset_mock()
+    inky.trigger_refresh()
+    inky.show()
+    assert not inky._send_command.called
+    assert inky.skipped_refreshes == 1
+
+
+def test_session_skips_reset(GPIO, spidev, smbus2):
+    """Test that updates in a session skip the reset, unchanged init commands and deep sleep."""
+    from inky import inky_jd79668
+
+    inky = inky_jd79668.Inky(gpio=mock.MagicMock(), spi_bus=mock.MagicMock())
+    inky._busy = mock.MagicMock()
+    inky._send_command = mock.MagicMock(wraps=inky._send_command)
+
+    def commands():
+        sent = [call[0][0] for call in inky._send_command.call_args_list]
+        inky._send_command.reset_mock()
+        return sent
+
+    def resets():
+        count = inky._busy.reset.call_count
+        inky._busy.reset.reset_mock()
+        return count
+
+    with inky.session():
+        inky.show()
+        first = commands()
+        assert resets() == 1
+        assert inky_jd79668.JD79668_DSLP not in first
+
+        inky.show(force=True)
+        second = commands()
+        assert resets() == 0
+        assert second == [inky_jd79668.JD79668_DTM, inky_jd79668.JD79668_PON, inky_jd79668.JD79668_DRF, inky_jd79668.JD79668_POF]
+
+    # Ending the session puts the display to sleep, so the next update resets it
+    assert commands() == [inky_jd79668.JD79668_DSLP]
+    inky.show(force=True)
+    assert resets() == 1
+    assert commands() == first + [inky_jd79668.JD79668_DSLP]
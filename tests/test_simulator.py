@@ -60,3 +60,12 @@ def test_mock_show_180(tkinter, PIL):
 
     inky = InkyMockPHAT('red', h_flip=True, v_flip=True)
     inky.show()
+
+
+def test_mock_show_force(tkinter, PIL):
+    """Test that show takes the same arguments as the drivers."""
+    from inky.mock import InkyMockImpression
+
+    inky = InkyMockImpression()
+    inky.show(force=True)
+    inky.show(busy_wait=False, force=False, region="dirty")
@@ -0,0 +1,40 @@
+"""SPI transport tests for Inky."""
+from unittest import mock
+
+
+def test_spi_write_list():
+    """Test that lists of ints are sent with xfer3."""
+    from inky import spi
+
+    spi_bus = mock.MagicMock()
+    spi.write(spi_bus, [0x10, 0x20])
+
+    spi_bus.xfer3.assert_called_once_with([0x10, 0x20])
+    spi_bus.writebytes2.assert_not_called()
+
+
+def test_spi_write_numpy():
+    """Test that numpy buffers are streamed without conversion to a list."""
+    import numpy
+
+    from inky import spi
+
+    spi_bus = mock.MagicMock()
+    spi.write(spi_bus, numpy.arange(16, dtype=numpy.uint8))
+
+    spi_bus.xfer3.assert_not_called()
+    data, = spi_bus.writebytes2.call_args[0]
+    assert isinstance(data, memoryview)
+    assert data.tolist() == list(range(16))
+
+
+def test_spi_write_fallback_chunks():
+    """Test the chunked fallback for spidev versions without writebytes2."""
+    import numpy
+
+    from inky import spi
+
+    spi_bus = mock.MagicMock(spec=["writebytes"])
+    spi.write(spi_bus, numpy.arange(10, dtype=numpy.uint8), chunk_size=4)
+
+    assert [c[0][0] for c in spi_bus.writebytes.call_args_list] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]